@@ -118,7 +118,35 @@ DEP_GENIA_DIR = os.path.join(CURRENT_DIR, "results/pickles/dep_genia_graphs")
 PARSE_PICKLE_DIR = os.path.join(CURRENT_DIR, "results/pickles/parse_trees")
 REL_PICKLE_DIR = os.path.join(CURRENT_DIR, "results/pickles/relations")
 
+# part of the cache key of generated relations, bump it when relation generation changes
+REL_VERSION = "2"
+
+# number of worker processes used to read protocols (tokenization, tagging, parsing and relation generation).
+# 1 reads all protocols in the current process.
+READ_WORKERS = 1
+
+# number of protocols handed to a worker process at once
+READ_CHUNKSIZE = 4
+
+# number of worker processes that generate the entity features of the protocols (see WLPDataset.__featurize).
+# 1 generates them in the current process.
+FEATURE_WORKERS = 1
+
+# number of tokenized lines kept in the process wide tokenizer cache (see preprocessing/tokenizer.py)
+TOKENIZER_CACHE_SIZE = 200000
+
+# number of parser JVMs that run at the same time in the corpus level parsing stages
+PARSE_WORKERS = 1
+
+# max number of sentences parsed by one parser JVM
+PARSE_BATCH_SIZE = 5000
+
 DB = os.path.join(CURRENT_DIR, "results/pickles/datasets.p")
+# directory of the corpus, saved as separately loadable (and memory mapped) parts, see corpus/CorpusStore.py
+CORPUS_STORE_DIR = os.path.join(CURRENT_DIR, "results/corpus_store")
+# when a saved corpus (CORPUS_STORE_DIR or DB) is loaded, bring it up to date with the protocols in ARTICLES_FOLDERPATH (see
+# WLPDataset.update) instead of using it as it was saved
+INCREMENTAL_BUILD = True
 DB_MAXENT = os.path.join(CURRENT_DIR, "results/pickles/dataset_maxent.p")
 DB_MAXENT_WITH_PARSETREES = os.path.join(CURRENT_DIR, "results/pickles/dataset_maxent_parse_trees.p")
 # Number of windows to use during training (offset is COUNT_WINDOWS_TEST, i.e. test windows will
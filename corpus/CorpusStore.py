@@ -0,0 +1,387 @@
+import json
+import os
+import pickle
+from functools import partial
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import config as cfg
+
+# attributes of a WLPDataset that are small and stored in the meta part
+META_ATTRS = ['rel_label_idx', 'pos_ids', 'min_wcount', 'lowercase', 'replace_digits', 'p_cnt', 'word_counts',
+              '_all_word_counts', 'file_hashes', 'dir_path']
+# attributes of a WLPDataset that are only needed to featurize new protocols (see WLPDataset.update) or to pick
+# feature columns, each stored in its own part (<attr>.p) and only unpickled when it is used
+LAZY_ATTRS = ['feat_list', 'featurizer']
+
+
+class CorpusStore(object):
+    """On disk format of a WLPDataset, split into parts that are loaded independently and only when used.
+
+    path/
+        vocab.json          word_index, char_index, tag_idx and is_oov
+        meta.p              the other small attributes of the dataset (pos_ids, word counts, ...)
+        feat_list.p         entity feature generators (with their unigram tables and lemma cache)
+        featurizer.p        SparseFeaturizer of the entity features (feature value codes and matrix columns)
+        embedding.npy       embedding matrix
+        tokens/             every token of the corpus as flat arrays: words.npy, originals.npy and labels.npy (ids in
+                            strings.json of the word, original text and label of each token), sent_offsets.npy (start
+                            of each sentence in words.npy), protocol_offsets.npy (first sentence of each protocol)
+                            and protocols.json (protocol names)
+        features.npy        entity feature table, one row per token (features.json holds its columns)
+        feature_offsets/    first row in features.npy of each protocol (protocols.npy) and sentence (sents.npy), in
+                            the order of tokens/
+        feature_matrix/     one hot entity feature matrix (CSR), as data.npy, indices.npy, indptr.npy and shape.npy
+        relations.p         relation feature table
+        protocols.p         the protocols, without their feature tables
+
+    The arrays are memory mapped, so loading them is near instant, only the pages that are used are read, and
+    processes that load the same store share those pages. E.g. inference only needs vocab.json, and the training
+    sentences are read from tokens/ (see sentences()), without unpickling protocols.p.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._vocab = None
+        self._meta = None
+
+    def part(self, *names):
+        return os.path.join(self.path, *names)
+
+    def write(self, name, write_fn, mode='wb'):
+        # written next to the part and renamed over it, so that processes that have the old part memory mapped keep
+        # reading the old file instead of a truncated one
+        path = self.part(*name.split('/'))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, mode, **({'encoding': 'utf-8'} if 'b' not in mode else {})) as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+
+    def write_array(self, name, array):
+        self.write(name, lambda f: np.save(f, array))
+
+    def write_json(self, name, obj):
+        self.write(name, lambda f: json.dump(obj, f), mode='w')
+
+    def write_pickle(self, name, obj):
+        self.write(name, lambda f: pickle.dump(obj, f))
+
+    def load_pickle(self, name):
+        with open(self.part(name), 'rb') as f:
+            return pickle.load(f)
+
+    def exists(self):
+        return os.path.isfile(self.part('vocab.json'))
+
+    @property
+    def vocab(self):
+        if self._vocab is None:
+            with open(self.part('vocab.json'), 'r', encoding='utf-8') as f:
+                self._vocab = json.load(f)
+        return self._vocab
+
+    @property
+    def word_index(self):
+        return self.vocab['word_index']
+
+    @property
+    def char_index(self):
+        return self.vocab['char_index']
+
+    @property
+    def is_oov(self):
+        # json only has string keys, is_oov is keyed on word ids
+        return {int(k): v for k, v in self.vocab['is_oov'].items()}
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with open(self.part('meta.p'), 'rb') as f:
+                self._meta = pickle.load(f)
+        return self._meta
+
+    @property
+    def tag_idx(self):
+        return self.vocab['tag_idx']
+
+    def load_array(self, *names):
+        return np.load(self.part(*names), mmap_mode='r')
+
+    def embedding_matrix(self):
+        return self.load_array('embedding.npy')
+
+    def has_tokens(self):
+        return os.path.isfile(self.part('tokens', 'strings.json'))
+
+    def protocol_names(self):
+        with open(self.part('tokens', 'protocols.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def tokens(self):
+        """Returns the token arrays (see the class doc) as a dict of name -> array, plus the strings and the protocol
+        names."""
+        arrays = {name: self.load_array('tokens', name + '.npy')
+                  for name in ['words', 'originals', 'labels', 'sent_offsets', 'protocol_offsets']}
+        with open(self.part('tokens', 'strings.json'), 'r', encoding='utf-8') as f:
+            arrays['strings'] = json.load(f)
+        arrays['protocols'] = self.protocol_names()
+        return arrays
+
+    def sentences(self, pnames, f_df=None):
+        """Returns (originals, words, labels, feature rows, protocol name) of each sentence of the protocols named
+        `pnames`, in the order of the store, the same as CustomDataset.boil_protocols does from the protocols.
+
+        `f_df` defaults to the stored feature table.
+        """
+        tokens = self.tokens()
+        strings = tokens['strings']
+        sent_offsets = tokens['sent_offsets']
+        protocol_offsets = tokens['protocol_offsets']
+        if f_df is None:
+            f_df = self.features()
+        f_offsets = self.feature_offsets('sents')
+        if f_offsets is None:
+            # stores saved before the offsets were written
+            f_offsets = sent_offsets
+
+        pnames = set(pnames)
+        sentences = []
+        for i, pno in enumerate(tokens['protocols']):
+            if pno not in pnames:
+                continue
+            for sent_idx in range(protocol_offsets[i], protocol_offsets[i + 1]):
+                start, end = sent_offsets[sent_idx], sent_offsets[sent_idx + 1]
+                f_start, f_end = f_offsets[sent_idx], f_offsets[sent_idx + 1]
+                sentences.append(tuple([strings[j] for j in tokens[name][start:end]]
+                                       for name in ['originals', 'words', 'labels']) +
+                                 (f_df[f_start:f_end] if f_df is not None else None, pno))
+
+        return sentences
+
+    def features(self):
+        if not os.path.isfile(self.part('features.npy')):
+            return None
+        with open(self.part('features.json'), 'r', encoding='utf-8') as f:
+            columns = json.load(f)
+
+        f_df = pd.DataFrame(self.load_array('features.npy'), columns=[c for c, _ in columns], copy=False)
+        # the table is stored with one dtype, columns that had another one get it back (only these are copied)
+        for c, dtype in columns:
+            if str(f_df[c].dtype) != dtype:
+                f_df[c] = f_df[c].astype(dtype)
+        return f_df
+
+    def feature_offsets(self, name):
+        """Returns the first row in the feature table of each of the 'protocols' or 'sents' (and the number of rows),
+        or None if the store has no offsets."""
+        if not os.path.isfile(self.part('feature_offsets', name + '.npy')):
+            return None
+        return self.load_array('feature_offsets', name + '.npy')
+
+    def feature_matrix(self):
+        if not os.path.isfile(self.part('feature_matrix', 'indptr.npy')):
+            return None
+        data, indices, indptr = [self.load_array('feature_matrix', name + '.npy')
+                                 for name in ['data', 'indices', 'indptr']]
+        return sparse.csr_matrix((data, indices, indptr), shape=tuple(self.load_array('feature_matrix', 'shape.npy')))
+
+    def relations(self):
+        if not os.path.isfile(self.part('relations.p')):
+            return None
+        with open(self.part('relations.p'), 'rb') as f:
+            return pickle.load(f)
+
+    def protocols(self, f_df=None):
+        """Returns the protocols, with their rows of `f_df` (defaults to the stored feature table) as their f_df."""
+        with open(self.part('protocols.p'), 'rb') as f:
+            protocols = pickle.load(f)
+
+        if f_df is None:
+            f_df = self.features()
+        if f_df is not None:
+            # each protocol gets its rows of the (memory mapped) feature table back
+            offsets = self.feature_offsets('protocols')
+            if offsets is None:
+                # stores saved before the offsets were written
+                offsets = np.cumsum([0] + [p.word_cnt for p in protocols])
+            for i, p in enumerate(protocols):
+                p.f_df = f_df[offsets[i]:offsets[i + 1]]
+
+        return protocols
+
+    def save(self, corpus):
+        """Writes all the parts of `corpus` (a WLPDataset)."""
+        os.makedirs(self.part('tokens'), exist_ok=True)
+
+        self.write_json('vocab.json', {'word_index': corpus.word_index, 'char_index': corpus.char_index,
+                                       'tag_idx': corpus.tag_idx,
+                                       'is_oov': {str(k): v for k, v in getattr(corpus, 'is_oov', dict()).items()}})
+        self.write_pickle('meta.p', {attr: getattr(corpus, attr) for attr in META_ATTRS if hasattr(corpus, attr)})
+        for attr in LAZY_ATTRS:
+            if hasattr(corpus, attr):
+                self.write_pickle(attr + '.p', getattr(corpus, attr))
+            elif os.path.isfile(self.part(attr + '.p')):
+                os.remove(self.part(attr + '.p'))
+
+        if hasattr(corpus, 'embedding_matrix'):
+            self.write_array('embedding.npy', np.asarray(corpus.embedding_matrix))
+
+        self.__save_tokens(corpus)
+
+        if getattr(corpus, 'f_df', None) is not None:
+            self.write_array('features.npy', corpus.f_df.values)
+            self.write_json('features.json', [(str(c), str(dtype)) for c, dtype in corpus.f_df.dtypes.items()])
+            self.__save_feature_offsets(corpus)
+
+        if getattr(corpus, 'f_matrix', None) is not None:
+            os.makedirs(self.part('feature_matrix'), exist_ok=True)
+            for name in ['data', 'indices', 'indptr']:
+                self.write_array('feature_matrix/' + name + '.npy', getattr(corpus.f_matrix, name))
+            self.write_array('feature_matrix/shape.npy', np.array(corpus.f_matrix.shape, dtype=np.int64))
+
+        if hasattr(corpus, 'rel_df'):
+            self.write_pickle('relations.p', corpus.rel_df)
+
+        # the feature tables of the protocols are views of features.npy, they are not pickled again
+        f_dfs = [p.f_df for p in corpus.protocols]
+        try:
+            for p in corpus.protocols:
+                p.f_df = None
+            self.write_pickle('protocols.p', corpus.protocols)
+        finally:
+            for p, f_df in zip(corpus.protocols, f_dfs):
+                p.f_df = f_df
+
+        self._vocab = None
+        self._meta = None
+
+    def __save_feature_offsets(self, corpus):
+        # the rows of each protocol are the ones WLPDataset gave it (its f_df), and follow its sentences, so they are
+        # sliced by these offsets instead of by counting tokens
+        protocol_offsets, sent_offsets = [0], [0]
+        for p in corpus.protocols:
+            lengths = [len(tokens1d) for tokens1d in p.tokens2d]
+            if sum(lengths) != len(p.f_df):
+                raise ValueError("Protocol {0} has {1} feature rows for {2} tokens".format(p.protocol_name,
+                                                                                          len(p.f_df), sum(lengths)))
+            sent_offsets.extend(protocol_offsets[-1] + np.cumsum(lengths, dtype=np.int64))
+            protocol_offsets.append(protocol_offsets[-1] + len(p.f_df))
+
+        os.makedirs(self.part('feature_offsets'), exist_ok=True)
+        self.write_array('feature_offsets/protocols.npy', np.array(protocol_offsets, dtype=np.int64))
+        self.write_array('feature_offsets/sents.npy', np.array(sent_offsets, dtype=np.int64))
+
+    def __save_tokens(self, corpus):
+        # string -> id, words, originals and labels share the strings
+        strings = dict()
+        words, originals, labels, sent_offsets, protocol_offsets = [], [], [], [0], [0]
+        for p in corpus.protocols:
+            for tokens1d in p.tokens2d:
+                for token in tokens1d:
+                    words.append(strings.setdefault(token.word, len(strings)))
+                    originals.append(strings.setdefault(token.original, len(strings)))
+                    labels.append(strings.setdefault(token.label, len(strings)))
+                sent_offsets.append(len(words))
+            protocol_offsets.append(len(sent_offsets) - 1)
+
+        for name, values in [('words', words), ('originals', originals), ('labels', labels),
+                             ('sent_offsets', sent_offsets), ('protocol_offsets', protocol_offsets)]:
+            self.write_array('tokens/' + name + '.npy', np.array(values, dtype=np.int64))
+
+        self.write_json('tokens/protocols.json', [p.protocol_name for p in corpus.protocols])
+        # written last, a store without it has no usable token arrays (see has_tokens)
+        self.write_json('tokens/strings.json', list(strings))
+
+
+class StoredProtocols(Sequence):
+    """The protocols of a store, only unpickled (from protocols.p) when one of them is used.
+
+    The names and the number of protocols are known without unpickling them, and the sentences of their tokens can
+    be read from the token arrays, see CorpusStore.sentences().
+    """
+
+    def __init__(self, store, f_df=None, names=None, load_fn=None):
+        self.store = store
+        self.f_df = f_df
+        self.names = store.protocol_names() if names is None else names
+        self._load_fn = load_fn or (lambda: store.protocols(f_df))
+        self._protocols = None
+
+    @property
+    def loaded(self):
+        return self._protocols is not None
+
+    def __load(self):
+        if self._protocols is None:
+            self._protocols = self._load_fn()
+        return self._protocols
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, item):
+        return self.__load()[item]
+
+    def __iter__(self):
+        return iter(self.__load())
+
+    def __reduce__(self):
+        # pickled as the list of protocols
+        return list, (list(self),)
+
+    def pick(self, pnames):
+        """Returns the protocols named `pnames` (in the order of the store), also unpickled only when used."""
+        pnames = set(pnames)
+        idx = [i for i, name in enumerate(self.names) if name in pnames]
+        return StoredProtocols(self.store, self.f_df, [self.names[i] for i in idx], lambda: [self[i] for i in idx])
+
+    def sentences(self):
+        """Returns the sentences of these protocols, see CorpusStore.sentences()."""
+        return self.store.sentences(self.names, self.f_df)
+
+
+def save_corpus(corpus, path):
+    CorpusStore(path).save(corpus)
+
+
+def load_corpus(path, dataset_class):
+    """Loads the WLPDataset (of class `dataset_class`) saved at `path`, without running its constructor.
+
+    The embedding matrix and the feature table and matrix are memory mapped. The protocols are only unpickled when
+    they are used (see StoredProtocols), and the relation feature table, the entity feature generators and the
+    featurizer when they are used.
+    """
+    store = CorpusStore(path)
+    corpus = dataset_class.__new__(dataset_class)
+    corpus.__dict__.update(store.meta)
+    corpus.word_index = store.word_index
+    corpus.char_index = store.char_index
+    corpus.tag_idx = store.tag_idx
+    corpus.is_oov = store.is_oov
+    cfg.CHAR_VOCAB = len(corpus.char_index)
+
+    if os.path.isfile(store.part('embedding.npy')):
+        corpus.embedding_matrix = store.embedding_matrix()
+
+    corpus.f_df = store.features()
+    f_matrix = store.feature_matrix()
+    if f_matrix is not None:
+        corpus.f_matrix = f_matrix
+    if store.has_tokens():
+        corpus.protocols = StoredProtocols(store, corpus.f_df)
+    else:
+        corpus.protocols = store.protocols(corpus.f_df)
+    corpus._lazy_parts = dict()
+    for attr in LAZY_ATTRS:
+        if os.path.isfile(store.part(attr + '.p')):
+            corpus._lazy_parts[attr] = partial(store.load_pickle, attr + '.p')
+    if os.path.isfile(store.part('relations.p')):
+        corpus._lazy_parts['rel_df'] = store.relations
+
+    corpus.train = None
+    corpus.dev = None
+    corpus.test = None
+    return corpus
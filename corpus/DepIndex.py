@@ -0,0 +1,31 @@
+class DepIndex(object):
+    """Word lookups over the triples of one sentence's dependency graph.
+
+    The triples are walked once, afterwards the dependent, governor and relation of a word are dict lookups instead
+    of a scan over all triples for every token.
+    """
+
+    def __init__(self, dep_graph):
+        """
+        Args:
+            dep_graph: nltk.DependencyGraph of a single sentence.
+        """
+        # governor word -> its first dependent (word, tag)
+        self.deps = dict()
+        # dependent word -> its last governor (word, tag)
+        self.govs = dict()
+        # dependent word -> its first relation
+        self.rels = dict()
+        for g, r, d in dep_graph.triples():
+            self.deps.setdefault(g[0], d)
+            self.govs[d[0]] = g
+            self.rels.setdefault(d[0], r)
+
+    def get_dep(self, word, default=(0, 0)):
+        return self.deps.get(word, default)
+
+    def get_gov(self, word, default=(0, 0)):
+        return self.govs.get(word, default)
+
+    def get_rel(self, word, default="#"):
+        return self.rels.get(word, default)
@@ -2,9 +2,10 @@ import itertools
 from collections import namedtuple
 
 import re
-from sacremoses import MosesTokenizer
 from torch.utils import data
 
+from preprocessing.tokenizer import tokenize_lines
+
 Data = namedtuple("Data", ['SENT', 'X', 'C'])
 
 
@@ -29,13 +30,8 @@ class InferenceDataset(data.Dataset):
     @staticmethod
     def tokenize(txt, to_lower=False):
         assert isinstance(txt, str)
-        tokenizer = MosesTokenizer()
-        lines = txt.split('\n')
-        t = [tokenizer.tokenize(line) for line in lines]
-        if to_lower:
-            return [[word.lower() for word in line] for line in t]
-        else:
-            return t
+        # the lowercased words come from the cached tokenization of the same lines
+        return tokenize_lines(txt.split('\n'), lowercase=to_lower)
 
     @staticmethod
     def arg_sort(l):
@@ -0,0 +1,68 @@
+# Stanford parser escapes these in its leaves, map them back so that leaves line up with the text of the tokens
+PTB_UNESCAPE = {'-LRB-': '(', '-RRB-': ')', '-LSB-': '[', '-RSB-': ']', '-LCB-': '{', '-RCB-': '}',
+                '``': '"', "''": '"'}
+
+
+class ParseIndex(object):
+    """Leaf positions and token alignment of one sentence's constituency parse tree.
+
+    Built once per sentence, so that every relation candidate in the sentence gets its parse tree path from cached
+    positions instead of converting the tree and searching its leaves again.
+    """
+
+    def __init__(self, parse_tree, tokens1d):
+        """
+        Args:
+            parse_tree: nltk Tree of the sentence.
+            tokens1d: the Tokens of the same sentence (ProtoFile.tokens2d[sent_idx]).
+        """
+        self.parse_tree = parse_tree
+        self.leaf_positions = parse_tree.treepositions('leaves')
+
+        # labels of all the nodes from the root down to the preterminal of each leaf
+        self.leaf_labels = [[parse_tree[position[:i]].label() for i in range(len(position))]
+                            for position in self.leaf_positions]
+        self.token_leaves = self.align([token.original for token in tokens1d], parse_tree.leaves())
+
+    @staticmethod
+    def align(words, leaves):
+        """Maps each word to the index of the leaf that contains its first character.
+
+        Whitespace is ignored on both sides, so words and leaves line up as long as they come from the same text,
+        even when the tokenizer and the parser split it differently.
+        """
+        leaf_ends = []
+        end = 0
+        for leaf in leaves:
+            end += len("".join(PTB_UNESCAPE.get(leaf, leaf).split()))
+            leaf_ends.append(end)
+
+        word_leaves = []
+        j = 0
+        start = 0
+        for word in words:
+            while j < len(leaf_ends) - 1 and leaf_ends[j] <= start:
+                j += 1
+            word_leaves.append(j)
+            start += len("".join(word.split()))
+
+        return word_leaves
+
+    def leaf_of(self, token_idx):
+        if not self.token_leaves:
+            return 0
+        return self.token_leaves[min(token_idx, len(self.token_leaves) - 1)]
+
+    def path(self, leaf1, leaf2):
+        """Returns the labels on the tree path from the preterminal of leaf1 up to the least common ancestor and down
+        to the preterminal of leaf2."""
+        location1 = self.leaf_positions[leaf1]
+        location2 = self.leaf_positions[leaf2]
+
+        # length of the common prefix of both tree positions, i.e. the position of the least common ancestor
+        lca_len = 0
+        while lca_len < len(location1) and lca_len < len(location2) and location1[lca_len] == location2[lca_len]:
+            lca_len += 1
+
+        # the lca itself is only counted on the way down, and the way up is reversed to go from the node to the lca
+        return self.leaf_labels[leaf1][lca_len + 1:][::-1] + self.leaf_labels[leaf2][lca_len:]
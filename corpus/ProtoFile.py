@@ -1,11 +1,9 @@
 import os
-import pickle
+import weakref
 from collections import namedtuple, Counter
 
 
 import nltk
-from nltk.parse.stanford import StanfordDependencyParser, StanfordParser
-from sacremoses import MosesTokenizer
 from tqdm import tqdm
 
 import config as cfg
@@ -17,32 +15,69 @@ from builtins import any as b_any
 import re
 
 import itertools as it
+from bisect import bisect_left, bisect_right
 from preprocessing.feature_engineering.pos import PosTagger
 import html
 
-from preprocessing.utils import get_stanford_dep_parser
+from corpus.DepIndex import DepIndex
+from corpus.ParseIndex import ParseIndex
+from corpus.TagIndex import TagIndex
+from corpus.TokenStore import TokenStore
+from preprocessing.artifact_cache import ArtifactCache
+from preprocessing.parse_stage import DepParseStage, ParseTreeStage
+from preprocessing.tag_cache import TagCache
+from preprocessing.tokenizer import tokenize, tokenize_lines
 
 logger = logging.getLogger(__name__)
 
 Tag = namedtuple("Tag", "tag_id, tag_name, start, end, words")
 Link = namedtuple("Link", "l_id, l_name, arg1, arg2")
 
+# what gets pickled for a Relation, everything else is resolved through its protocol
+RelationRecord = namedtuple("RelationRecord", "protocol_key, label, sent_idx, arg1, arg2, arg1_tag_id, arg2_tag_id, "
+                                              "feature_values")
+
+# protocol_key -> ProtoFile of every protocol loaded in this process. Unpickled relations only know the key of their
+# protocol and use this registry to get back to it. The key is the normalised path of the protocol, protocols with the
+# same name in different directories are different protocols.
+PROTOCOLS = weakref.WeakValueDictionary()
+
+
+def protocol_key(filename):
+    return os.path.normcase(os.path.abspath(filename))
+
+
+def get_protocol(key):
+    try:
+        return PROTOCOLS[key]
+    except KeyError:
+        raise KeyError("Protocol {0} is not loaded, load it before using its relations".format(key))
+
 
 # its a good idea to keep a datastructure like
 # list of sentences, where each sentence is a list of words : [[word1, word2, word3,...], [word1, word2...]]
 
 class ProtoFile:
-    def __init__(self, filename, genia, gen_features, lowercase, replace_digits, to_filter):
+    def __init__(self, filename, genia, gen_features, lowercase, replace_digits, to_filter, defer_parse=False):
+        """
+        Args:
+            genia: the tagger that generates pos_tags (see preprocessing/feature_engineering/taggers.py), or None to use
+                the stanford pos tagger.
+            defer_parse: if True, sentences without cached dependencies or parse trees are not parsed here, and
+                filtering and relation generation are left to finish(). This lets the corpus level DepParseStage and
+                ParseTreeStage parse the sentences of all protocols at once before finishing them.
+        """
         self.filename = filename
         self.basename = os.path.basename(filename)
         self.protocol_name = self.basename
+        self.protocol_key = protocol_key(filename)
+        PROTOCOLS[self.protocol_key] = self
         self.text_file = self.filename + '.txt'
         self.ann_file = self.filename + '.ann'
 
         with io.open(self.text_file, 'r', encoding='utf-8', newline='') as t_f, io.open(self.ann_file, 'r',
                                                                                         encoding='utf-8',
                                                                                         newline='') as a_f:
-            self.tokenizer = MosesTokenizer()
             self.lines = []
             for line in t_f.readlines():
                 self.lines.append(html.unescape(line))
@@ -51,36 +86,66 @@ class ProtoFile:
             self.ann = a_f.readlines()
             self.status = self.__pretest()
             self.links = []
+            # hit/miss counts of the artifact caches used while loading this protocol
+            self.cache_stats = Counter()
 
         if self.status:
-            sents = [self.tokenizer.tokenize(line) for line in self.lines]  # generate list of list of words
+            sents = tokenize_lines(self.lines)  # generate list of list of words
             self.heading = sents[0]
             self.sents = sents[1:]
+            self.sent_bounds = self.__gen_sent_bounds()
             self.tags = self.__parse_tags()
             self.unique_tags = set([tag.tag_name for tag in self.tags])
             self.__std_index()
             self.__parse_links()
             self.tag_0_id = 'T0'
             self.tag_0_name = 'O'
-            self.tokens2d = self.gen_tokens(labels_allowed=cfg.LABELS, lowercase=lowercase,
-                                            replace_digits=replace_digits)
-            self.tokens2d = [[self.clean_html_tag(token) for token in token1d] for token1d in self.tokens2d]
+            tokens2d = self.gen_tokens(labels_allowed=cfg.LABELS, lowercase=lowercase,
+                                       replace_digits=replace_digits)
+            tokens2d = [[self.clean_html_tag(token) for token in token1d] for token1d in tokens2d]
+            # tokens are stored column wise, tokens2d is a list of sentence views over the store
+            self.token_store = TokenStore(tokens2d)
+            self.tokens2d = self.token_store.sentences()
+            self.token_starts = self.__gen_token_offsets()
 
             self.word_cnt = sum(len(tokens1d) for tokens1d in self.tokens2d)
             self.f_df = None
             if gen_features:
                 if genia:
-                    self.pos_tags = self.__gen_pos_genia(genia)
+                    self.pos_tags = self.__gen_pos(genia)
                 else:
                     self.pos_tags = self.__gen_pos_stanford()
 
-                self.conll_deps = self.__gen_dep()
-                self.parse_trees = self.__gen_parse_trees()
+                self.conll_deps = self.__load_dep()
+                self.parse_trees = self.__load_parse_trees()
+
+            self.gen_features = gen_features
+            self.to_filter = to_filter
+            if not defer_parse:
+                self.finish()
 
-            if to_filter:
-                self.filter()
+    def finish(self):
+        """Parses the dependencies and parse trees that are still missing, then filters and generates the relations."""
+        if self.gen_features and self.conll_deps is None:
+            DepParseStage().run([self])
+        if self.gen_features and self.parse_trees is None:
+            ParseTreeStage().run([self])
 
-            self.relations = self.gen_relations()
+        if self.to_filter:
+            self.filter()
+
+        self.relations = self.gen_relations()
+
+    def __getstate__(self):
+        # the memoized dep graphs / indexes are not pickled, they are cheap to rebuild
+        state = self.__dict__.copy()
+        for attr in ['dep_graphs', 'dep_indexes', 'parse_indexes']:
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        PROTOCOLS[self.protocol_key] = self
 
     @staticmethod
     def clean_html_tag(token):
@@ -105,70 +170,97 @@ class ProtoFile:
         self.tokens2d = new_tokens2d
         self.pos_tags = new_pos_tags
         self.conll_deps = new_conll_deps
+        self.dep_graphs = None
+        self.dep_indexes = None
+        self.parse_indexes = None
 
     def get_deps(self):
-        return [nltk.DependencyGraph(conll_dep, top_relation_label='root') for conll_dep in self.conll_deps]
-
-    def __gen_parse_trees(self):
-        p_cache = os.path.join(cfg.PARSE_PICKLE_DIR, self.protocol_name + '.p')
+        # parsed once per protocol, relation features ask for these several times per relation candidate
+        if getattr(self, 'dep_graphs', None) is None:
+            self.dep_graphs = [nltk.DependencyGraph(conll_dep, top_relation_label='root')
+                               for conll_dep in self.conll_deps]
+        return self.dep_graphs
+
+    def get_dep_indexes(self):
+        if getattr(self, 'dep_indexes', None) is None:
+            self.dep_indexes = [DepIndex(dep_graph) for dep_graph in self.get_deps()]
+        return self.dep_indexes
+
+    def get_parse_indexes(self):
+        # leaf positions and token alignment of each parse tree, built once and shared by all relations of a sentence
+        if getattr(self, 'parse_indexes', None) is None:
+            self.parse_indexes = [ParseIndex(parse_tree, tokens1d)
+                                  for parse_tree, tokens1d in zip(self.parse_trees, self.tokens2d)]
+        return self.parse_indexes
+
+    def __parse_cache(self):
+        return ArtifactCache(cfg.PARSE_PICKLE_DIR, "parse", feat_cfg.STANFORD_PARSER_VERSION, self.cache_stats)
+
+    def parse_sents(self):
+        # the sentences given to the constituency parser
+        return self.lines[1:]
+
+    def __load_parse_trees(self):
+        # None if the sentences still need to be parsed, see finish() and ParseTreeStage
+        cache = self.__parse_cache()
         try:
-            parse_trees = pickle.load(open(p_cache, 'rb'))
-
-        except(pickle.UnpicklingError, EOFError, FileNotFoundError):
+            return cache.load(cache.key(self.parse_sents()))
+        except KeyError:
+            return None
 
-            parser = StanfordParser(path_to_jar=feat_cfg.STANFORD_PARSER_JAR,
-                                    path_to_models_jar=feat_cfg.STANFORD_PARSER_MODEL_JAR,
-                                    java_options="-mx3000m")
-            temp_trees = list(parser.raw_parse_sents(self.lines[1:]))
-            parse_trees = [next(trees) for trees in temp_trees]
-            os.makedirs(os.path.dirname(p_cache), exist_ok=True)
-            pickle.dump(parse_trees, open(p_cache, 'wb'))
+    def set_parse_trees(self, parse_trees):
+        """Sets (and caches) the parse trees of the sentences, as parsed by a ParseTreeStage."""
+        cache = self.__parse_cache()
+        cache.save(cache.key(self.parse_sents()), parse_trees)
+        self.parse_trees = parse_trees
+        self.parse_indexes = None
 
-        return parse_trees
+    def __dep_cache(self):
+        return ArtifactCache(cfg.DEP_PICKLE_DIR, "dep", feat_cfg.STANFORD_PARSER_VERSION, self.cache_stats)
 
-    @get_stanford_dep_parser(path_to_jar=feat_cfg.STANFORD_PARSER_JAR,
-                             path_to_models_jar=feat_cfg.STANFORD_PARSER_MODEL_JAR)
-    def __gen_dep(self, dep_parser):
-        d_cache = os.path.join(cfg.DEP_PICKLE_DIR, self.protocol_name + '.p')
+    def __load_dep(self):
+        # None if the sentences still need to be parsed, see finish() and DepParseStage
+        cache = self.__dep_cache()
         try:
-            # loading saved dep parsers
-            conll_deps = pickle.load(open(d_cache, 'rb'))
+            return cache.load(cache.key(self.pos_tags))
+        except KeyError:
+            return None
 
-        except (pickle.UnpicklingError, EOFError, FileNotFoundError):
-            # adding pos data to dep parser speeds up dep generation even further
-            dep_graphs = [sent_dep for sent_dep in dep_parser.tagged_parse_sents(self.pos_tags)]
+    def set_deps(self, conll_deps):
+        """Sets (and caches) the conll dependencies of the sentences, as parsed by a DepParseStage."""
+        cache = self.__dep_cache()
+        cache.save(cache.key(self.pos_tags), conll_deps)
+        self.conll_deps = conll_deps
+        self.dep_graphs = None
+        self.dep_indexes = None
 
-            # save dependency graph in conll format
-            conll_deps = [next(deps).to_conll(10) for deps in dep_graphs]
-            os.makedirs(os.path.dirname(d_cache), exist_ok=True)
-            pickle.dump(conll_deps, open(d_cache, 'wb'))
+    def __gen_pos(self, pos_tagger):
+        # pos_tagger is one of the taggers of preprocessing/feature_engineering/taggers.py, e.g. a GeniaTaggerPool
+        cache = ArtifactCache(cfg.POS_GENIA_DIR, pos_tagger.name, pos_tagger.version, self.cache_stats)
+        sents = [" ".join(sent) for sent in self.sents]
 
-        return conll_deps
+        def tag():
+            # sentences tagged for other protocols (or an older tokenization of this one) come from the sentence cache
+            with TagCache(feat_cfg.POS_TAGGER_CACHE_FILEPATH, pos_tagger.name, pos_tagger.version,
+                          max_entries=feat_cfg.POS_TAGGER_CACHE_SIZE) as tag_cache:
+                return tag_cache.tag_sents(sents, pos_tagger.tag_sents)
 
-    def __gen_pos_genia(self, pos_tagger):
-        p_cache = os.path.join(cfg.POS_GENIA_DIR, self.protocol_name + '.p')
-        try:
-            pos_tags = pickle.load(open(p_cache, 'rb'))
-        except (pickle.UnpicklingError, EOFError, FileNotFoundError):
-            pos_tags = pos_tagger.parse_through_file([" ".join(sent) for sent in self.sents])
-            os.makedirs(os.path.dirname(p_cache), exist_ok=True)
-            pickle.dump(pos_tags, open(p_cache, 'wb'))
-        return pos_tags
+        return cache.get_or_compute(sents, tag)
 
     def __gen_pos_stanford(self):
-        pos = PosTagger(feat_cfg.STANFORD_POS_JAR_FILEPATH, feat_cfg.STANFORD_MODEL_FILEPATH,
-                        cache_filepath=None)
-        p_cache = os.path.join(cfg.POS_PICKLE_DIR, self.protocol_name + '.p')
-        try:
-            pos_tags = pickle.load(open(p_cache, 'rb'))
-        except (pickle.UnpicklingError, EOFError, FileNotFoundError):
-            pos_tags = pos.tag_sents(self.sents)
+        cache = ArtifactCache(cfg.POS_PICKLE_DIR, "stanford_pos", feat_cfg.STANFORD_POS_VERSION, self.cache_stats)
+
+        def tag():
+            # the tag cache is written and its connection closed even if tagging fails
+            with PosTagger(feat_cfg.STANFORD_POS_JAR_FILEPATH, feat_cfg.STANFORD_MODEL_FILEPATH,
+                           cache_filepath=feat_cfg.POS_TAGGER_CACHE_FILEPATH,
+                           cache_size=feat_cfg.POS_TAGGER_CACHE_SIZE) as pos:
+                pos_tags = pos.tag_sents(self.sents)
             # for some reason stanford parser deletes words that are just underscores, and
             # dependency parser cannot deal with an empty text in pos tagger, so the below hack.
-            pos_tags = [[pos_tag if pos_tag[0] else ('_', pos_tag[1]) for pos_tag in p1d] for p1d in pos_tags]
-            pickle.dump(pos_tags, open(p_cache, 'wb'))
+            return [[pos_tag if pos_tag[0] else ('_', pos_tag[1]) for pos_tag in p1d] for p1d in pos_tags]
 
-        return pos_tags
+        return cache.get_or_compute(self.sents, tag)
 
     def cnt_words(self):
         if self.status:
@@ -218,13 +310,17 @@ class ProtoFile:
         # so that they are easier to resolve later
         # given that Txx can be independently resolved,
         # whereas Exx sometimes have forward and backward dependencies
+        # single pass over the annotations to map every Exx to its trigger Txx. Building this before any line is
+        # rewritten resolves forward references (an event used before it is defined) without rescanning self.ann
+        self.event_triggers = dict()
+        for _line in self.ann:
+            if _line[0] == 'E':
+                spl = _line.split()
+                self.event_triggers[spl[0]] = spl[1].split(':')[1]
+
         def search_tag(e_id):
             if e_id[0] == 'E':
-                for _line in self.ann:
-                    if _line.find(e_id) == 0:
-                        logging.info(_line.rstrip())
-                        spl = _line.split()
-                        return spl[1].split(':')[1]
+                return self.event_triggers[e_id]
             else:
                 return e_id
 
@@ -274,20 +370,26 @@ class ProtoFile:
         if self.links:
             logger.error("Already parsed, I am not parsing again")
             return
+        self.link_by_id = dict()
         for line in [t for t in self.ann if (t[0] == 'E' or t[0] == 'R')]:
             if line[0] == 'E':
                 e = self.__parse_e(line)
                 self.links.extend(e)
+                if e:
+                    self.link_by_id[e[0].l_id] = e[0]
             elif line[0] == 'R':
                 r = self.__parse_r(line)
                 self.links.append(r)
+                self.link_by_id[r.l_id] = r
 
     def get_tag_by_id(self, tid):
         if tid[0] == 'T':
-            ret = [tag for tag in self.tags if tag.tag_id == tid]
+            return self.tag_by_id[tid]
+        elif tid in self.event_triggers:
+            # events resolve to their trigger, this also works for events that are not parsed yet
+            return self.tag_by_id[self.event_triggers[tid]]
         else:
-            ret = [link.arg1 for link in self.links if link.l_id == tid]
-        return ret[0]
+            return self.link_by_id[tid].arg1
 
     # TODO test
     def get_wb(self, tag1, tag2):
@@ -305,11 +407,8 @@ class ProtoFile:
         if tag1.end > tag2.start:
             tag1, tag2 = tag2, tag1
 
-        idx = tag1.start
-        while idx < tag2.end:
-            tag = self.get_tag_by_start(idx)
-
-            idx = tag.end
+        # all tags spanned from the start of tag1 to the end of tag2 (both included)
+        return self.tag_index.contained(tag1.start, tag2.end)
 
     # TODO test
     def surr_words(self, tag, n):
@@ -362,9 +461,13 @@ class ProtoFile:
                     tag_name=tag_name,
                     start=int(start),
                     end=int(end),
-                    words=self.tokenizer.tokenize(temp[2]))
+                    words=tokenize(temp[2]))
 
             tags.append(t)
+
+        # offset index, so that tags can be resolved by character offset without scanning self.tags
+        self.tag_index = TagIndex(tags)
+        self.tag_by_id = {tag.tag_id: tag for tag in tags}
         return tags
 
     @staticmethod
@@ -387,9 +490,9 @@ class ProtoFile:
         return list(zip(tag.words, labels))
 
     def get_tag_by_start(self, start):
-        for tag in self.tags:
-            if tag.start == start:
-                return tag
+        tag = self.tag_index.get_by_start(start)
+        if tag:
+            return tag
 
         logging.debug("Protocol={0}: No tag found with start == {1}".format(self.protocol_name, start))
         return None
@@ -439,71 +542,90 @@ class ProtoFile:
 
         return ret
 
-    def get_token_idx(self, tag):
-        def get_sentence_by_tag(t, lines, p):
-            # find the sentence number based on tag.
-            s = t.start
-            e = t.end
-            assert s < e, p.basename
+    def __gen_sent_bounds(self):
+        # cumulative character offsets of the sentences, sentence i spans [sent_bounds[i], sent_bounds[i + 1])
+        bounds = [len(self.lines[0])]
+        for line in self.lines[1:]:
+            bounds.append(bounds[-1] + len(line))
 
-            sent_start = len(lines[0])
-            sent_end = sent_start
-            for i, sent in enumerate(lines[1:]):
-                sent_end += len(sent)
-                if sent_start <= s and e <= sent_end:
-                    return i
+        return bounds
 
-                sent_start = sent_end
+    def get_sent_idx(self, tag):
+        # index of the sentence (in self.sents) that fully contains the tag, None if the tag is not inside a sentence
+        i = bisect_right(self.sent_bounds, tag.start) - 1
+        if 0 <= i < len(self.sent_bounds) - 1 and tag.end <= self.sent_bounds[i + 1]:
+            return i
 
-            return None
+        return None
+
+    def __gen_token_offsets(self):
+        # absolute character offset of the start of every token, one sorted list per sentence. Tokens are aligned on
+        # token.original since token.word may be lowercased or have its digits replaced.
+        token_starts = []
+        for sent_idx, tokens1d in enumerate(self.tokens2d):
+            line = html.unescape(self.lines[sent_idx + 1])
+            offset = self.sent_bounds[sent_idx]
+            starts = []
+            pos = 0
+            for token in tokens1d:
+                found = line.find(token.original, pos)
+                if found == -1:
+                    # token text differs from the line (tokenizer normalisation), keep it at the current position
+                    starts.append(offset + pos)
+                else:
+                    starts.append(offset + found)
+                    pos = found + len(token.original)
+
+            token_starts.append(starts)
+
+        return token_starts
 
-        sent_idx = get_sentence_by_tag(tag, self.lines, self)
+    def get_token_idx(self, tag):
+        assert tag.start < tag.end, self.basename
+        sent_idx = self.get_sent_idx(tag)
 
         assert sent_idx is not None
 
-        tokens1d = self.tokens2d[sent_idx]
-        offset = sum([len(sent) for sent in self.lines[:sent_idx + 1]])
-        start = offset
-        s_idx = 0
-
-        while start < tag.start:
-            # did not find s_idx, increment start to the next token's start
-            start = offset + html.unescape(self.lines[sent_idx + 1]).find(tokens1d[s_idx + 1].word,
-                                                                          start - offset + len(tokens1d[s_idx].word))
-            s_idx += 1
-
-        end = start
-        e_idx = s_idx
-        while end < tag.end:
-            if e_idx + 1 == len(tokens1d):
-                e_idx += 1
-                break
-            end = offset + html.unescape(self.lines[sent_idx + 1]).find(tokens1d[e_idx + 1].word,
-                                                                        end - offset + len(tokens1d[e_idx].word))
-            e_idx += 1
+        # first token starting at or after the tag start, up to the first token starting at or after the tag end
+        starts = self.token_starts[sent_idx]
+        s_idx = bisect_left(starts, tag.start)
+        e_idx = bisect_left(starts, tag.end, s_idx)
 
         return sent_idx, (s_idx, e_idx)
 
     def gen_relations(self):
-        r_cache = os.path.join(cfg.REL_PICKLE_DIR, self.protocol_name + '.p')
-        try:
-            relations = pickle.load(open(r_cache, 'rb'))
-        except (pickle.UnpicklingError, EOFError, FileNotFoundError):
-            relations = self.__gen_relations()
-            os.makedirs(os.path.dirname(r_cache), exist_ok=True)
-            pickle.dump(relations, open(r_cache, 'wb'))
+        # relations depend on the annotations, the tokens (and their labels) and the parse trees
+        cache = ArtifactCache(cfg.REL_PICKLE_DIR, "relations",
+                              "{0}:{1}".format(cfg.REL_VERSION, feat_cfg.STANFORD_PARSER_VERSION), self.cache_stats)
+        inputs = (self.lines, self.ann,
+                  [[(token.word, token.label) for token in tokens1d] for tokens1d in self.tokens2d])
+        relations = cache.get_or_compute(inputs, self.__gen_relations)
+        # cached relations may come from another protocol with the same content
+        for relation in relations:
+            relation.p = self
         return relations
 
+    def __gen_neg_candidates(self, gold_pairs):
+        # relations are only extracted within a sentence, so candidate pairs are only generated within each
+        # sentence bucket instead of over all permutations of tags in the protocol.
+        buckets = dict()
+        for tag in self.tags:
+            sent_idx = self.get_sent_idx(tag)
+            if sent_idx is not None:
+                buckets.setdefault(sent_idx, []).append(tag)
+
+        for sent_idx in sorted(buckets):
+            for arg1, arg2 in it.permutations(buckets[sent_idx], 2):
+                if (tuple(arg1.words), tuple(arg2.words)) not in gold_pairs:
+                    yield arg1, arg2
+
     # based on the assumption that a link is always between two arguments, both being in the same sentence.
     def __gen_relations(self):
         ret = []
-        arg_perm = list(it.permutations(self.tags, 2))
+        # candidates that have the same words as a gold link are not used as negatives
+        gold_pairs = set((tuple(link.arg1.words), tuple(link.arg2.words)) for link in self.links)
 
         for link in self.links:
-            # remove all the links that do exist from this list
-            arg_perm = [(_arg1, _arg2) for _arg1, _arg2 in arg_perm
-                        if _arg1.words != link.arg1.words or _arg2.words != link.arg2.words]
-
             # assumption that both args are in the same sentence
             sent_idx1, arg1 = self.get_token_idx(link.arg1)
             sent_idx2, arg2 = self.get_token_idx(link.arg2)
@@ -535,11 +657,10 @@ class ProtoFile:
 
                 ret.append(Relation(self, link.l_name, sent_idx1, self.parse_trees[sent_idx1], arg1, arg2, link.arg1, link.arg2))
 
-        for arg1, arg2 in tqdm(arg_perm, desc="arg_perm " + self.protocol_name):
-            sent_idx1, arg1_idx = self.get_token_idx(arg1)
-            sent_idx2, arg2_idx = self.get_token_idx(arg2)
-            if sent_idx1 == sent_idx2:
-                ret.append(Relation(self, 'O', sent_idx1, self.parse_trees[sent_idx1], arg1_idx, arg2_idx, arg1, arg2))
+        for arg1, arg2 in tqdm(self.__gen_neg_candidates(gold_pairs), desc="arg_perm " + self.protocol_name):
+            sent_idx, arg1_idx = self.get_token_idx(arg1)
+            _, arg2_idx = self.get_token_idx(arg2)
+            ret.append(Relation(self, 'O', sent_idx, self.parse_trees[sent_idx], arg1_idx, arg2_idx, arg1, arg2))
 
         return ret
 
@@ -588,9 +709,9 @@ class Relation(object):
         self.arg2 = arg2
         self.p = protocol
         self.label = l_name
-        self.arg1_tag = arg1_tag
-        self.arg2_tag = arg2_tag
-        self.parse_tree = sent_parse_tree
+        self.arg1_tag_id = arg1_tag.tag_id
+        self.arg2_tag_id = arg2_tag.tag_id
+        # sent_parse_tree is always protocol.parse_trees[sent_idx], it is looked up from the protocol when needed
 
         self.feature_values = None
 
@@ -601,6 +722,47 @@ class Relation(object):
         assert isinstance(self.sent_idx, int)
         assert isinstance(self.p, ProtoFile)
 
+    def __getstate__(self):
+        # only a compact record is pickled, not the parent protocol with its tokens, parse trees and deps
+        return RelationRecord(self.protocol_key, self.label, self.sent_idx, self.arg1, self.arg2, self.arg1_tag_id,
+                              self.arg2_tag_id, self.feature_values)
+
+    def __setstate__(self, record):
+        record = RelationRecord(*record)
+        self.protocol_key = record.protocol_key
+        self._p = None
+        self.label = record.label
+        self.sent_idx = record.sent_idx
+        self.arg1 = record.arg1
+        self.arg2 = record.arg2
+        self.arg1_tag_id = record.arg1_tag_id
+        self.arg2_tag_id = record.arg2_tag_id
+        self.feature_values = record.feature_values
+
+    @property
+    def p(self):
+        # resolved lazily, the protocol may be unpickled after its relations
+        if self._p is None:
+            self._p = get_protocol(self.protocol_key)
+        return self._p
+
+    @p.setter
+    def p(self, protocol):
+        self._p = protocol
+        self.protocol_key = protocol.protocol_key
+
+    @property
+    def arg1_tag(self):
+        return self.p.tag_by_id[self.arg1_tag_id]
+
+    @property
+    def arg2_tag(self):
+        return self.p.tag_by_id[self.arg2_tag_id]
+
+    @property
+    def parse_tree(self):
+        return self.p.parse_trees[self.sent_idx]
+
     def sameNP(self):
         c_type = self.__is_same_chunk()
         return c_type == "NP"
@@ -619,6 +781,9 @@ class Relation(object):
     def arg2_deps(self):
         return self.__arg_deps(self.arg2)
 
+    def parse_index(self):
+        return self.p.get_parse_indexes()[self.sent_idx]
+
     def get_arg1_tokens(self):
         return self.__get_tokens(self.arg1)
 
@@ -668,19 +833,9 @@ class Relation(object):
             return list2d[self.sent_idx][self.arg1[1]:self.arg1[1] + no]
 
     def __arg_deps(self, arg):
-        def get_deps(triples, word):
-            dep = (0, 0)
-            for g, r, d in triples:
-                if g[0] == word:
-                    dep = d
-                    return dep
-
-            return dep
-
-        dep_graph = self.p.get_deps()[self.sent_idx]
-        t = dep_graph.triples()
+        dep_index = self.p.get_dep_indexes()[self.sent_idx]
         tokens = self.__get_tokens(arg)
-        deps = [get_deps(t, token.word) for token in tokens]
+        deps = [dep_index.get_dep(token.word) for token in tokens]
 
         return deps
 
@@ -727,6 +882,7 @@ class Token(object):
         token.feature_values: The feature values, after they have been applied.
             (See EntityWindow.apply_features().)
     """
+    __slots__ = ('word', 'label', 'original', 'feature_values')
 
     def __init__(self, word, label=cfg.NO_NE_LABEL, lowercase=False, replace_digits=False):
         """Initialize a new Token object.
@@ -0,0 +1,54 @@
+from bisect import bisect_left, bisect_right
+
+
+class TagIndex(object):
+    """Offset index over the tags of a single protocol.
+
+    Tags are looked up by their exact start offset through a dict, and by span through a list of tags sorted on
+    (start, end). Span queries bisect on the start offsets and use the longest tag span to bound how far back an
+    overlapping tag can start, so overlapping and partially overlapping tags are found without scanning every tag.
+    """
+
+    def __init__(self, tags):
+        """Builds the index.
+
+        Args:
+            tags: list of tags, anything with a `start` and `end` character offset (e.g. ProtoFile.Tag).
+        """
+        self.by_start = dict()
+        for tag in tags:
+            # keep the first tag in file order when several tags share a start offset
+            if tag.start not in self.by_start:
+                self.by_start[tag.start] = tag
+
+        self.spans = sorted(tags, key=lambda t: (t.start, t.end))
+        self.starts = [tag.start for tag in self.spans]
+        self.max_len = max([tag.end - tag.start for tag in self.spans], default=0)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def get_by_start(self, start):
+        """Returns the tag that starts at the character offset `start`, or None."""
+        return self.by_start.get(start)
+
+    def overlapping(self, start, end):
+        """Returns all tags that share at least one character with [start, end), sorted by (start, end)."""
+        lo = bisect_right(self.starts, start - self.max_len)
+        hi = bisect_left(self.starts, end)
+        return [tag for tag in self.spans[lo:hi] if tag.end > start]
+
+    def contained(self, start, end):
+        """Returns all tags that lie completely inside [start, end), sorted by (start, end)."""
+        lo = bisect_left(self.starts, start)
+        hi = bisect_left(self.starts, end)
+        return [tag for tag in self.spans[lo:hi] if tag.end <= end]
+
+    def partial(self, start, end):
+        """Returns all tags that overlap [start, end) without being contained in it or containing it."""
+        return [tag for tag in self.overlapping(start, end)
+                if (tag.start < start < tag.end < end) or (start < tag.start < end < tag.end)]
+
+    def at(self, offset):
+        """Returns all tags that cover the character at `offset`."""
+        return self.overlapping(offset, offset + 1)
@@ -0,0 +1,150 @@
+import sys
+
+import numpy as np
+
+
+class TokenStore(object):
+    """Columnar storage of the tokens of one protocol.
+
+    Words and labels are kept as ids into small per-protocol vocabularies (NumPy arrays), and the sentence
+    boundaries as offsets into these arrays, instead of one Python object per token. ProtoFile.tokens2d is a list
+    of SentenceViews over the store, whose items are TokenViews with the same attributes as a Token (word, original,
+    label, feature_values), so existing code keeps working on it.
+    """
+
+    def __init__(self, tokens2d):
+        """
+        Args:
+            tokens2d: list of sentences, each a list of Token objects.
+        """
+        self.vocab = []
+        self.label_vocab = []
+        self.word_ids = dict()
+        self.label_ids = dict()
+
+        words = []
+        originals = []
+        labels = []
+        offsets = [0]
+        for tokens1d in tokens2d:
+            for token in tokens1d:
+                words.append(self.word_id(token.word))
+                originals.append(self.word_id(token.original))
+                labels.append(self.label_id(token.label))
+            offsets.append(offsets[-1] + len(tokens1d))
+
+        self.words = np.array(words, dtype=np.int32)
+        self.originals = np.array(originals, dtype=np.int32)
+        self.labels = np.array(labels, dtype=np.int16)
+        self.sent_offsets = np.array(offsets, dtype=np.int64)
+
+        # filled in by EntityWindow.apply_features, None until then
+        self.feature_values = [None] * len(words)
+
+    def __getstate__(self):
+        # the reverse lookups are rebuilt from the vocabularies
+        state = self.__dict__.copy()
+        del state['word_ids']
+        del state['label_ids']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.word_ids = {word: i for i, word in enumerate(self.vocab)}
+        self.label_ids = {label: i for i, label in enumerate(self.label_vocab)}
+
+    def word_id(self, word):
+        if word not in self.word_ids:
+            self.word_ids[word] = len(self.vocab)
+            # interned, so that protocols share the memory of words they have in common
+            self.vocab.append(sys.intern(word))
+        return self.word_ids[word]
+
+    def label_id(self, label):
+        if label not in self.label_ids:
+            self.label_ids[label] = len(self.label_vocab)
+            self.label_vocab.append(label)
+        return self.label_ids[label]
+
+    def __len__(self):
+        return len(self.words)
+
+    def sent_cnt(self):
+        return len(self.sent_offsets) - 1
+
+    def sentences(self):
+        return [SentenceView(self, sent_idx) for sent_idx in range(self.sent_cnt())]
+
+    def sent_words(self, sent_idx):
+        start, end = self.sent_offsets[sent_idx], self.sent_offsets[sent_idx + 1]
+        return [self.vocab[i] for i in self.words[start:end]]
+
+    def sent_labels(self, sent_idx):
+        start, end = self.sent_offsets[sent_idx], self.sent_offsets[sent_idx + 1]
+        return [self.label_vocab[i] for i in self.labels[start:end]]
+
+
+class SentenceView(object):
+    """A sentence of a TokenStore, behaves like a list of TokenViews."""
+    __slots__ = ('store', 'sent_idx')
+
+    def __init__(self, store, sent_idx):
+        self.store = store
+        self.sent_idx = sent_idx
+
+    def __len__(self):
+        return int(self.store.sent_offsets[self.sent_idx + 1] - self.store.sent_offsets[self.sent_idx])
+
+    def __getitem__(self, item):
+        start = int(self.store.sent_offsets[self.sent_idx])
+        if isinstance(item, slice):
+            return [TokenView(self.store, start + i) for i in range(len(self))[item]]
+        return TokenView(self.store, start + range(len(self))[item])
+
+    def __iter__(self):
+        start = int(self.store.sent_offsets[self.sent_idx])
+        for i in range(start, start + len(self)):
+            yield TokenView(self.store, i)
+
+    def __repr__(self):
+        return "SentenceView({0})".format(self.store.sent_words(self.sent_idx))
+
+
+class TokenView(object):
+    """A single token of a TokenStore, with the attributes of a Token."""
+    __slots__ = ('store', 'idx')
+
+    def __init__(self, store, idx):
+        self.store = store
+        self.idx = idx
+
+    @property
+    def word(self):
+        return self.store.vocab[self.store.words[self.idx]]
+
+    @word.setter
+    def word(self, word):
+        self.store.words[self.idx] = self.store.word_id(word)
+
+    @property
+    def original(self):
+        return self.store.vocab[self.store.originals[self.idx]]
+
+    @property
+    def label(self):
+        return self.store.label_vocab[self.store.labels[self.idx]]
+
+    @label.setter
+    def label(self, label):
+        self.store.labels[self.idx] = self.store.label_id(label)
+
+    @property
+    def feature_values(self):
+        return self.store.feature_values[self.idx]
+
+    @feature_values.setter
+    def feature_values(self, feature_values):
+        self.store.feature_values[self.idx] = feature_values
+
+    def __repr__(self):
+        return "TokenView({0}, {1})".format(self.word, self.label)
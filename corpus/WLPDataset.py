@@ -1,13 +1,17 @@
 import glob
+import hashlib
 import logging
 import os
-from collections import namedtuple, OrderedDict
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from collections import namedtuple, OrderedDict, Counter
 
 from gensim.models import KeyedVectors, Word2Vec
 from tabulate import tabulate
 
-from preprocessing.feature_engineering.GeniaTagger import GeniaTagger
+from preprocessing.feature_engineering.taggers import create_pos_tagger
 from sklearn.preprocessing import OneHotEncoder
+from scipy import sparse
 
 from tqdm import tqdm
 
@@ -19,9 +23,13 @@ from torch.utils import data
 
 import config as cfg
 from preprocessing.feature_engineering import features, rel_features
-from preprocessing.feature_engineering.datasets import EntityWindow, RelationWindow
+from preprocessing.feature_engineering.datasets import EntityWindow, RelationWindow, concat_columns, expand_skipchain
+from preprocessing.feature_engineering.sparse_features import MISSING, SparseFeaturizer
+from preprocessing.artifact_cache import format_stats
+from preprocessing.parse_stage import DepParseStage, ParseTreeStage
 import pandas as pd
 
+from corpus.CorpusStore import StoredProtocols, load_corpus, save_corpus
 from corpus.ProtoFile import ProtoFile
 import itertools
 from builtins import any as b_any
@@ -40,13 +48,14 @@ logger = logging.getLogger(__name__)
 
 
 class CustomDataset(data.Dataset):
-    def __init__(self, protocols, char_index, word_index, pos_ids, tag_idx, is_oov):
+    def __init__(self, protocols, char_index, word_index, pos_ids, tag_idx, is_oov, collection=None):
+        # collection: the sentences of protocols if they are already known (see CorpusStore.sentences)
         self.protocols = protocols
         self.char_index = char_index
         self.word_index = word_index
         self.pos_index = pos_ids
         self.tag_idx = tag_idx
-        self.collection = self.boil_protocols()
+        self.collection = self.boil_protocols() if collection is None else collection
         self.is_oov = is_oov
         self.words = list(
             itertools.chain.from_iterable([[word for word in sent] for _, sent, _, _, _ in self.collection]))
@@ -176,9 +185,81 @@ class Features(object):
         return self.encoder.transform(df.values)
 
 
+# pos tagger of the read worker processes, see init_read_worker
+_pos_tagger = None
+_close_pos_tagger = None
+
+
+def init_read_worker(backend, read_workers):
+    # every read worker starts one tagger (e.g. one pool of geniatagger sessions) for all of its protocols, instead of
+    # getting a copy of the tagger, which starts sessions of its own, with every chunk of tasks
+    global _pos_tagger, _close_pos_tagger
+    _pos_tagger = create_pos_tagger(backend, read_workers)
+    # pool workers do not run atexit handlers, finalizers are run when they exit (after pool.close())
+    _close_pos_tagger = Finalize(_pos_tagger, _pos_tagger.close, exitpriority=10) \
+        if hasattr(_pos_tagger, 'close') else None
+
+
+def close_read_worker():
+    global _pos_tagger, _close_pos_tagger
+    if _close_pos_tagger is not None:
+        _close_pos_tagger()
+    _pos_tagger, _close_pos_tagger = None, None
+
+
+def read_protocol(args):
+    # module level, so that it can be sent to worker processes. Empty protocols are dropped in the worker, so that
+    # they are never pickled back to the parent. The pos tagger is the one started by init_read_worker.
+    filename, gen_features, lowercase, replace_digits, to_filter = args
+    # parsing is left to the corpus level parse stages, see read_protocols
+    article = ProtoFile(filename, _pos_tagger, gen_features, lowercase, replace_digits, to_filter, defer_parse=True)
+    return article if article.status else None
+
+
+# feature generators of the entity feature worker processes, see init_feature_worker
+_feat_list = None
+
+
+def init_feature_worker(feat_list):
+    # the feature generators (and the unigram tables they hold) are handed to each worker once, instead of with every
+    # protocol. Forked workers get them without pickling and share their pages with the parent, as they only read them.
+    global _feat_list
+    _feat_list = feat_list
+
+
+def protocol_ent_features(args):
+    """Returns the entity feature columns of the words of a protocol (see datasets.expand_skipchain) and their number.
+
+    `args` is (protocol, do_dep), the feature generators are the ones given to init_feature_worker. Module level, so
+    that it can be sent to worker processes.
+    """
+    p, do_dep = args
+    deps = p.get_deps() if do_dep else None
+
+    tables = []
+    lengths = []
+    for x, (tokens1d, pos) in enumerate(zip(p.tokens2d, p.pos_tags)):
+        window = EntityWindow(tokens1d, p.protocol_name, pos, deps[x] if deps else None)
+        window.apply_features(_feat_list)
+        tables.append(window.feature_columns())
+        lengths.append(len(tokens1d))
+
+    return WLPDataset.skipchain_columns(tables, lengths), sum(lengths)
+
+
+def file_hash(filename):
+    # hash of the .txt/.ann pair of a protocol, filename is without extension
+    h = hashlib.sha1()
+    for ext in ['.txt', '.ann']:
+        with open(filename + ext, 'rb') as f:
+            h.update(f.read())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
 class WLPDataset:
     def __init__(self, prep_emb=True, gen_rel_feat=False, gen_ent_feat=False, min_wcount=1, shuffle_once=True,
-                 lowercase=False, replace_digits=False, dir_path=None):
+                 lowercase=False, replace_digits=False, dir_path=None, workers=None):
 
         self.lowercase = lowercase
         self.replace_digits = replace_digits
@@ -186,13 +267,17 @@ class WLPDataset:
         self.word_counts = OrderedDict()
         self.char_index = dict()
         self.min_wcount = min_wcount
-        genia = GeniaTagger(feat_cfg.GENIA_TAGGER_FILEPATH)
-        print("Using GENIA POS TAGGER")
+        print("Using {0} POS TAGGER".format(feat_cfg.POS_TAGGER_BACKEND.upper()))
         if dir_path is None:
             dir_path = cfg.ARTICLES_FOLDERPATH
 
-        self.protocols = self.read_protocols(skip_files=cfg.SKIP_FILES, genia=genia, gen_features=True,
-                                             dir_path=dir_path)
+        self.dir_path = dir_path
+        # hashes of the .txt/.ann pairs that are read (including empty protocols), see update(). They are taken before
+        # reading, so a file that changes while the corpus is built is seen as changed by the next update()
+        self.file_hashes = {filename: file_hash(filename) for filename in self.list_filenames(dir_path,
+                                                                                                cfg.SKIP_FILES)}
+        self.protocols = self.read_protocols(skip_files=cfg.SKIP_FILES, gen_features=True,
+                                             filenames=list(self.file_hashes), workers=workers)
 
         # not used... TODO (for cleanup phase) use.
         # self.ent_features = Features(ent_enc, ent_df)
@@ -216,13 +301,189 @@ class WLPDataset:
             self.feat_list = features.create_features(self.protocols)
             print(
                 "Loading windows with features {0} ...".format([type(feature).__name__ for feature in self.feat_list]))
-            self.enc, self.f_df = self.__gen_all_ent_features(do_dep=False)
+            self.f_df = self.__gen_all_ent_features(do_dep=False)
 
         if gen_rel_feat:
             relations = [p.relations for p in self.protocols]
             self.rel_df = self.get_rel_fvectors(relations)
             self.features = Features(self.rel_df)
 
+    def __getattr__(self, name):
+        # parts of a loaded corpus that are only read from its store when they are used, see load()
+        lazy_parts = self.__dict__.get('_lazy_parts')
+        if lazy_parts and name in lazy_parts:
+            value = lazy_parts.pop(name)()
+            setattr(self, name, value)
+            return value
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        # the lazy parts are read, so that a pickle of the corpus has all of it
+        for name in list(self.__dict__.get('_lazy_parts', dict())):
+            getattr(self, name)
+        state = self.__dict__.copy()
+        state.pop('_lazy_parts', None)
+        return state
+
+    @classmethod
+    def load(cls, path):
+        """Loads a corpus saved with save(), see CorpusStore."""
+        corpus = load_corpus(path, cls)
+        if 'rel_df' in corpus.__dict__.get('_lazy_parts', dict()):
+            corpus._lazy_parts['features'] = lambda: Features(corpus.rel_df)
+        return corpus
+
+    def save(self, path):
+        save_corpus(self, path)
+
+    def update(self, dir_path=None, workers=None):
+        """Brings the corpus up to date with the .txt/.ann pairs in dir_path, without rebuilding it.
+
+        The pairs are compared by hash with the ones the corpus was built from, only added and changed protocols are
+        read, and removed (and changed) ones are dropped. New words and characters get new ids at the end of
+        word_index and char_index (and new rows in the embedding matrix, see extend_vocab), new feature values get
+        new ids and matrix columns, and the feature rows of the new protocols are added, so all existing ids stay the
+        same. The entity features of the new protocols are generated with the feature list the corpus was built with.
+
+        Returns True if the corpus changed.
+        """
+        if dir_path is None:
+            dir_path = getattr(self, 'dir_path', None) or cfg.ARTICLES_FOLDERPATH
+        # corpora pickled before hashes were recorded: every protocol counts as changed
+        old_hashes = getattr(self, 'file_hashes', None) or {p.filename: None for p in self.protocols}
+        new_hashes = {filename: file_hash(filename) for filename in self.list_filenames(dir_path, cfg.SKIP_FILES)}
+
+        added = [filename for filename in new_hashes if filename not in old_hashes]
+        changed = [filename for filename in new_hashes
+                   if filename in old_hashes and old_hashes[filename] != new_hashes[filename]]
+        removed = [filename for filename in old_hashes if filename not in new_hashes]
+        print("added: {0}, changed: {1}, removed: {2} protocols".format(len(added), len(changed), len(removed)))
+        if not (added or changed or removed):
+            return False
+
+        stale = set(changed + removed)
+        if hasattr(self, 'rel_df'):
+            # relation feature rows of each protocol, in the order of self.protocols
+            rel_dfs = self.__split_rows(self.rel_df, [len(p.relations) for p in self.protocols])
+            rel_dfs = {p.filename: df for p, df in zip(self.protocols, rel_dfs) if p.filename not in stale}
+        if hasattr(self, 'featurizer'):
+            # entity feature matrix rows of each protocol, the feature codes are kept in the f_df of the protocols
+            f_matrices = self.__split_rows(self.f_matrix, [len(p.f_df) for p in self.protocols])
+            f_matrices = {p.filename: m for p, m in zip(self.protocols, f_matrices) if p.filename not in stale}
+
+        new_protocols = self.read_protocols(gen_features=True, skip_files=cfg.SKIP_FILES,
+                                            filenames=sorted(added + changed), workers=workers)
+
+        if hasattr(self, 'embedding_matrix'):
+            # the words of the dropped protocols no longer count towards min_wcount, words keep their ids though
+            all_word_counts = self.all_word_counts
+            all_word_counts.subtract(self.count_words([p for p in self.protocols if p.filename in stale]))
+            self.all_word_counts = Counter({w: c for w, c in all_word_counts.items() if c > 0})
+            self.extend_vocab(new_protocols)
+
+        if hasattr(self, 'featurizer'):
+            new_df, new_matrix, p_cut_list = self.__featurize(new_protocols)
+            for i, p in enumerate(new_protocols):
+                p.f_df = new_df[p_cut_list[i]:p_cut_list[i + 1]]
+                f_matrices[p.filename] = new_matrix[p_cut_list[i]:p_cut_list[i + 1]]
+            # new pos tags get the ids after the existing ones, and NULL moves behind them
+            self.pos_ids = self.__gen_pos_ids()
+
+        self.protocols = sorted([p for p in self.protocols if p.filename not in stale] + new_protocols,
+                                key=lambda p: p.filename)
+        self.p_cnt = len(self.protocols)
+
+        if hasattr(self, 'featurizer'):
+            columns = list(self.f_df.columns) + [c for c in new_df.columns if c not in self.f_df.columns]
+            mega_df = pd.concat([p.f_df for p in self.protocols], ignore_index=True)[columns]
+            # columns that are new to the corpus are missing in the rows of the old protocols
+            for c in columns:
+                if mega_df[c].isnull().any():
+                    mega_df[c] = mega_df[c].fillna(self.featurizer.code(c, MISSING)).astype(np.int64)
+            p_cut_list = np.cumsum([0] + [len(p.f_df) for p in self.protocols])
+            for i, p in enumerate(self.protocols):
+                p.f_df = mega_df[p_cut_list[i]:p_cut_list[i + 1]]
+            self.f_df = mega_df
+            self.f_matrix = sparse.vstack([self.featurizer.widen(f_matrices[p.filename]) for p in self.protocols],
+                                          format='csr')
+
+        if hasattr(self, 'rel_df'):
+            new_rel_df = self.get_rel_fvectors([p.relations for p in new_protocols])
+            new_rel_dfs = self.__split_rows(new_rel_df, [len(p.relations) for p in new_protocols])
+            rel_dfs.update({p.filename: df for p, df in zip(new_protocols, new_rel_dfs)})
+            self.rel_df = pd.concat([rel_dfs[p.filename] for p in self.protocols], ignore_index=True).fillna("#")
+            self.features = Features(self.rel_df)
+
+        self.dir_path = dir_path
+        self.file_hashes = new_hashes
+        return True
+
+    @staticmethod
+    def __split_rows(df, counts):
+        cuts = np.cumsum([0] + counts)
+        return [df[cuts[i]:cuts[i + 1]] for i in range(len(counts))]
+
+    def extend_vocab(self, protocols):
+        """Adds the words and characters of `protocols` that are not in word_index / char_index yet, after the existing
+        ids. The embedding rows of new words are their pre-trained vectors, or random if they have none (these words
+        are added to cfg.OOP_FILEPATH)."""
+        sents = [[token.word for token in tokens1d] for p in protocols for tokens1d in p.tokens2d]
+        self.all_word_counts.update(w for sent in sents for w in sent)
+        self.word_counts = self.__vocab_counts()
+
+        new_words = [w for w in self.word_counts if w not in self.word_index]
+        new_words.sort(key=lambda w: self.word_counts[w], reverse=True)
+        next_id = max(self.word_index.values()) + 1
+        for i, word in enumerate(new_words):
+            self.word_index[word] = next_id + i
+
+        for sent in sents:
+            for w in sent:
+                for char in w:
+                    if char not in self.char_index:
+                        self.char_index[char] = len(self.char_index)
+        cfg.CHAR_VOCAB = len(self.char_index.items())
+
+        missing_rows = max(self.word_index.values()) + 1 - self.embedding_matrix.shape[0]
+        if missing_rows > 0:
+            new_rows = np.random.uniform(low=-0.01, high=0.01, size=(missing_rows, self.embedding_matrix.shape[1]))
+            self.embedding_matrix = np.vstack([self.embedding_matrix, new_rows])
+
+        if new_words:
+            # like in prepare_embeddings, only the words that are not in the pre-trained vectors stay random
+            skip_gram_model = self.load_word2vec()
+            with open(cfg.OOP_FILEPATH, 'a') as f:
+                for word in new_words:
+                    try:
+                        self.embedding_matrix[self.word_index[word]] = skip_gram_model[word]
+                    except KeyError:
+                        f.write('{0}\n'.format(word))
+                        cfg.ver_print('out of pre-trained vocab word', word)
+
+        print("added {0} words to the vocabulary".format(len(new_words)))
+
+    @property
+    def all_word_counts(self):
+        """Counts of all the words of the protocols, word_counts only has the ones that reach min_wcount."""
+        if getattr(self, '_all_word_counts', None) is None:
+            # corpora built before the full counts were kept
+            self._all_word_counts = self.count_words(self.protocols)
+        return self._all_word_counts
+
+    @all_word_counts.setter
+    def all_word_counts(self, counts):
+        self._all_word_counts = counts
+
+    @staticmethod
+    def count_words(protocols):
+        return Counter(token.word for p in protocols for tokens1d in p.tokens2d for token in tokens1d)
+
+    def __vocab_counts(self):
+        # remove all words that have counts less than self.min_wcount
+        if self.min_wcount:
+            return {k: v for k, v in self.all_word_counts.items() if v >= self.min_wcount}
+        return OrderedDict(self.all_word_counts)
+
     def get_rel_fvectors(self, relations):
         print("Collecting all the relation features ...")
         rel_feat_list = rel_features.create_features()
@@ -260,16 +521,11 @@ class WLPDataset:
                 or a generator of strings (for memory-efficiency)
         """
 
+        all_word_counts = Counter()
         for sent in sents:
-            for w in sent:
-                if w in self.word_counts:
-                    self.word_counts[w] += 1
-                else:
-                    self.word_counts[w] = 1
-
-        # remove all words in this dictionary, that have counts less than self.min_wcount
-        if self.min_wcount:
-            self.word_counts = {k: v for k, v in self.word_counts.items() if v >= self.min_wcount}
+            all_word_counts.update(sent)
+        self.all_word_counts = all_word_counts
+        self.word_counts = self.__vocab_counts()
 
         wcounts = list(self.word_counts.items())
         wcounts.sort(key=lambda x: x[1], reverse=True)
@@ -313,14 +569,7 @@ class WLPDataset:
         # train a skip gram model to generate word vectors. Vectors will be of dimension given by 'size' parameter.
         print("         Loading Word2Vec ...")
         if load_bin:
-            print("                     Loading a Massive File ...")
-            if not os.path.isfile(cfg.PUBMED_AND_PMC_W2V_BIN):
-                url = "http://evexdb.org/pmresources/vec-space-models/PubMed-and-PMC-w2v.bin"
-                dirpath = os.path.dirname(cfg.PUBMED_AND_PMC_W2V_BIN)
-                print("Downloading Word2Vec resource ...")
-                download(url, save_filepath=cfg.PUBMED_AND_PMC_W2V_BIN)
-
-            skip_gram_model = KeyedVectors.load_word2vec_format(cfg.PUBMED_AND_PMC_W2V_BIN, binary=True)
+            skip_gram_model = self.load_word2vec()
         else:
             skip_gram_model = Word2Vec(sentences=sents, size=cfg.EMBEDDING_DIM, sg=1, window=10, min_count=1,
                                        workers=4)
@@ -362,6 +611,17 @@ class WLPDataset:
 
         return embedding_matrix
 
+    @staticmethod
+    def load_word2vec():
+        """Loads the pre-trained PubMed and PMC word vectors, downloading them first if needed."""
+        print("                     Loading a Massive File ...")
+        if not os.path.isfile(cfg.PUBMED_AND_PMC_W2V_BIN):
+            url = "http://evexdb.org/pmresources/vec-space-models/PubMed-and-PMC-w2v.bin"
+            print("Downloading Word2Vec resource ...")
+            download(url, save_filepath=cfg.PUBMED_AND_PMC_W2V_BIN)
+
+        return KeyedVectors.load_word2vec_format(cfg.PUBMED_AND_PMC_W2V_BIN, binary=True)
+
     @staticmethod
     def make_bio_dict(labels):
         d = dict()
@@ -380,18 +640,23 @@ class WLPDataset:
         print("pname : {}".format(self.protocols[0].protocol_name))
         return list(filter(lambda p: p.protocol_name in pnames, self.protocols))
 
-    def gen_data(self, train_p, dev_p, test_p):
+    def __gen_dataset(self, pnames):
+        if isinstance(self.protocols, StoredProtocols) and not self.protocols.loaded:
+            # loaded corpus: the sentences are read from the token arrays of the store, the protocols stay on disk
+            protocols = self.protocols.pick(pnames)
+            collection = protocols.sentences()
+        else:
+            protocols = self.pick_protocols(pnames)
+            collection = None
+
+        return CustomDataset(protocols, self.char_index, self.word_index, self.pos_ids, self.tag_idx, self.is_oov,
+                             collection)
 
-        train_protocols = self.pick_protocols(train_p)
-        dev_protocols = self.pick_protocols(dev_p)
-        test_protocols = self.pick_protocols(test_p)
+    def gen_data(self, train_p, dev_p, test_p):
 
-        self.train = CustomDataset(train_protocols, self.char_index, self.word_index, self.pos_ids,
-                                   self.tag_idx, self.is_oov)
-        self.dev = CustomDataset(dev_protocols, self.char_index, self.word_index, self.pos_ids,
-                                 self.tag_idx, self.is_oov)
-        self.test = CustomDataset(test_protocols, self.char_index, self.word_index, self.pos_ids,
-                                  self.tag_idx, self.is_oov)
+        self.train = self.__gen_dataset(train_p)
+        self.dev = self.__gen_dataset(dev_p)
+        self.test = self.__gen_dataset(test_p)
 
         print("train: \n\tno. of protocols = {0} \n\tno. of sents = {1}".format(
             len(self.train.protocols), len(self.train)))
@@ -420,13 +685,12 @@ class WLPDataset:
         return differences
 
     def __gen_all_rel_features(self, relations, rel_feat_list):
-        mega_list = []
+        tables = []
 
         for rlist in tqdm(relations):
-            f_dicts = self.__gen_single_rel_feature(rlist, rel_feat_list)
-            mega_list.extend(f_dicts)
+            tables.append(self.__gen_single_rel_feature(rlist, rel_feat_list))
 
-        mega_df = pd.DataFrame(mega_list)
+        mega_df = pd.DataFrame(self.skipchain_columns(tables, [len(rlist) for rlist in relations]))
         mega_df = mega_df.fillna("#")
         print(list(mega_df.columns.values))
         print("mega_df shape", mega_df.shape)
@@ -437,66 +701,77 @@ class WLPDataset:
         # expect all information to be packed in each link in links
         window = RelationWindow(relations)
         window.apply_features(rel_feat_list)
-        feature_dicts = []
-        for link_idx in range(len(window.relations)):
-            # do this only if we need to get features from left and right side of the links as well.
-            fvl = window.get_feature_values_list(link_idx, feat_cfg.SKIPCHAIN_LEFT, feat_cfg.SKIPCHAIN_RIGHT)
-            feature_dicts.append(fvl)
 
-        # df = pd.DataFrame(feature_dicts)
-
-        return feature_dicts
-
-    def __gen_all_ent_features(self, do_dep=False):
-        # updates each protocol in self.protocols with its feature set.
-        i = 0
-        p_cut_list = [0]
-        mega_list = []
+        return window.feature_columns()
 
-        print("Loading Dep Graphs ...")
-        for p in tqdm(self.protocols, desc="Collecting features"):
+    @staticmethod
+    def skipchain_columns(tables, lengths):
+        # stacks the column tables of the windows (`lengths` rows each) and adds the features of the neighbours of each
+        # row in its window (feat_cfg.SKIPCHAIN_LEFT / RIGHT), for all the windows at once
+        sent_ids = np.repeat(np.arange(len(lengths)), lengths)
+        return expand_skipchain(concat_columns(tables, lengths), sent_ids,
+                                feat_cfg.SKIPCHAIN_LEFT, feat_cfg.SKIPCHAIN_RIGHT)
+
+    def __iter_ent_features(self, protocols, do_dep=False, workers=None, chunksize=None):
+        # yields the feature columns of the words of each protocol (and their number), in the order of protocols
+        for p in protocols:
             if len(p.tokens2d) != len(p.pos_tags):
                 print(p.protocol_name, self.__get_missing(p.tokens2d, p.pos_tags))
 
-            if do_dep:
-                deps = p.get_deps()
-
-            for x, (tokens1d, pos) in enumerate(zip(p.tokens2d, p.pos_tags)):
-                pno = p.protocol_name
-                if do_dep and deps:
-                    d = deps[x]
-                else:
-                    d = None
-
-                feature_dicts = self.__gen_single_feature(tokens1d, pno, pos, d)
-                mega_list.extend(feature_dicts)
-
-            p_cut_list.append(i + p.word_cnt)
-            i += p.word_cnt
+        if workers is None:
+            workers = cfg.FEATURE_WORKERS
+        if chunksize is None:
+            chunksize = cfg.READ_CHUNKSIZE
+
+        args = [(p, do_dep) for p in protocols]
+        if workers > 1:
+            # imap returns the features in the order of protocols, no matter which worker finishes first
+            with Pool(processes=workers, initializer=init_feature_worker, initargs=(self.feat_list,)) as pool:
+                for result in tqdm(pool.imap(protocol_ent_features, args, chunksize=chunksize), total=len(args),
+                                   desc="Collecting features"):
+                    yield result
+        else:
+            init_feature_worker(self.feat_list)
+            for arg in tqdm(args, desc="Collecting features"):
+                yield protocol_ent_features(arg)
+
+    def __featurize(self, protocols, do_dep=False, workers=None):
+        # encodes the features of protocols with self.featurizer, one protocol at a time (in order, so that the feature
+        # ids do not depend on the number of workers), and only the feature strings of the protocols in flight are held
+        # at once. Returns the feature codes (one row per word), the one hot feature matrix and the index of the first
+        # row of each protocol.
+        code_tables = []
+        lengths = []
+        for f_columns, n_rows in self.__iter_ent_features(protocols, do_dep, workers):
+            code_tables.append(self.featurizer.add(f_columns, n_rows))
+            lengths.append(n_rows)
+
+        return self.featurizer.frame(code_tables, lengths), self.featurizer.matrix(), np.cumsum([0] + lengths)
+
+    def __gen_pos_ids(self):
+        # ids of the pos tags are their feature codes, NULL (the pos of the start / end of a sentence) comes after them
+        pos_ids = dict(self.featurizer.codes['0:pos'])
+        pos_ids['NULL'] = len(pos_ids)
+        return pos_ids
 
-        mega_df = pd.DataFrame(mega_list)
-        mega_df = mega_df.fillna(0)
+    def __gen_all_ent_features(self, do_dep=False):
+        # updates each protocol in self.protocols with its feature set.
+        print("Loading Dep Graphs ...")
+        # value -> id of each feature column and feature -> column of f_matrix, extended by update() so that existing
+        # ids never change
+        self.featurizer = SparseFeaturizer()
+        mega_df, self.f_matrix, p_cut_list = self.__featurize(self.protocols, do_dep)
         print(tabulate(mega_df[:10], headers='keys', tablefmt='psql'))
-        char_cols = mega_df.dtypes.pipe(lambda x: x[x == 'object']).index
-        print(char_cols)
-        unique_ids = dict.fromkeys(char_cols)
-        for c in char_cols:
-            mega_df[c], unique_ids[c] = pd.factorize(mega_df[c])
+        print("f_matrix shape", self.f_matrix.shape)
 
-        print(unique_ids)
-
-        pos_id_list = unique_ids['0:pos'].get_values().tolist()
-        self.pos_ids = {k: v for v, k in enumerate(pos_id_list)}
-        self.pos_ids['NULL'] = len(self.pos_ids)
+        self.pos_ids = self.__gen_pos_ids()
 
         if do_dep:
 
-            rel_id_list = unique_ids['0:rel'].get_values().tolist()
-            self.rel_ids = {k: v for v, k in enumerate(rel_id_list)}
+            self.rel_ids = dict(self.featurizer.codes['0:rel'])
             self.rel_ids['NULL'] = len(self.rel_ids)
 
-            dep_id_list = unique_ids['0:gov'].get_values().tolist()
-            self.dep_ids = {k: v for v, k in enumerate(dep_id_list)}
+            self.dep_ids = dict(self.featurizer.codes['0:gov'])
             self.dep_ids['NULL'] = len(self.dep_ids)
 
             f_dep = mega_df['0:gov'].as_matrix().tolist()
@@ -515,67 +790,96 @@ class WLPDataset:
 
             self.f_dep = f_dep
 
-        print(tabulate(mega_df[:10], headers='keys', tablefmt='psql'))
-        enc = OneHotEncoder()
-        enc.fit(mega_df.as_matrix())
-
-        # redistribute the one hot features generated into each protocol
+        # redistribute the features generated into each protocol
         for i, p in enumerate(self.protocols):
             p.f_df = mega_df[p_cut_list[i]:p_cut_list[i + 1]]
 
-        return enc, mega_df
-
-    def __gen_single_feature(self, tokens1d, pno, pos, dep=None):
-        window = EntityWindow(tokens1d, pno, pos, dep)
-        window.apply_features(self.feat_list)
-        feature_dicts = []
-        for word_idx in range(len(window.tokens)):
-            fvl = window.get_feature_values_list(word_idx, feat_cfg.SKIPCHAIN_LEFT, feat_cfg.SKIPCHAIN_RIGHT)
-            feature_dicts.append(fvl)
-
-        # df = pd.DataFrame(feature_dicts)
-
-        return feature_dicts
+        return mega_df
 
     def load_filenames(self, dir_path):
         filenames = self.__from_dir(dir_path, extension="ann")
         return filenames
 
-    def read_protocols(self, gen_features, skip_files, genia=None, dir_path=None, filenames=None):
+    @staticmethod
+    def list_filenames(dir_path, skip_files=None):
+        # filenames without extension expected (as both ann, txt parsed in ProtoFile)
+        #Todo: optimize below code. make _from_dir working
+        #filenames = self.__from_dir(dir_path, extension="ann")
+
+        files = []
+        for file in os.listdir(dir_path):
+            fname = file.split('.')[0]
+            fpath = os.path.join(dir_path, fname)
+            files.append(fpath)
+
+        # sorted, so that protocols are always loaded in the same order
+        filenames = sorted(set(files))
+        if skip_files:
+            filenames = [filename for filename in filenames if filename not in skip_files]
+
+        return filenames
+
+    def read_protocols(self, gen_features, skip_files, pos_tagger=None, dir_path=None, filenames=None, workers=None,
+                       chunksize=None):
+        """Reads the protocols of `filenames` (or of the files in `dir_path`), `workers` (defaults to cfg.READ_WORKERS)
+        at a time, pos tagging them with the `pos_tagger` backend (defaults to feat_cfg.POS_TAGGER_BACKEND, see
+        taggers.create_pos_tagger). Empty protocols are dropped."""
         if dir_path is None and filenames is None:
             raise ValueError("Both dir path and filenames are None")
 
         if dir_path and filenames is None:
-            # filenames without extension expected (as both ann, txt parsed in ProtoFile)
-            #Todo: optimize below code. make _from_dir working
-            #filenames = self.__from_dir(dir_path, extension="ann")
-
-            files = []
-            for file in os.listdir(dir_path):
-                fname = file.split('.')[0]
-                fpath = os.path.join(dir_path, fname)
-                files.append(fpath)
-
-            filenames = []
-            fileSet = set(files)
-
-            for file in fileSet:
-                filenames.append(file)
+            filenames = self.list_filenames(dir_path, skip_files)
+            if skip_files:
+                print(filenames)
 
         if cfg.FILTER_ALL_NEG:
             print("FILTERING BAD SENTENCES")
 
         if skip_files:
-            print(filenames)
             filenames = [filename for filename in filenames if filename not in skip_files]
 
-        articles = [ProtoFile(filename, genia, gen_features, self.lowercase, self.replace_digits, cfg.FILTER_ALL_NEG)
-                    for filename in tqdm(filenames)]
+        if workers is None:
+            workers = cfg.READ_WORKERS
+        if chunksize is None:
+            chunksize = cfg.READ_CHUNKSIZE
+
+        if pos_tagger is None:
+            pos_tagger = feat_cfg.POS_TAGGER_BACKEND
+
+        args = [(filename, gen_features, self.lowercase, self.replace_digits, cfg.FILTER_ALL_NEG)
+                for filename in filenames]
+
+        if workers > 1:
+            # downloads / builds the tagger here once, instead of in every worker at the same time
+            create_pos_tagger(pos_tagger, workers)
+            # imap returns the protocols in the order of filenames, no matter which worker finishes first
+            with Pool(processes=workers, initializer=init_read_worker, initargs=(pos_tagger, workers)) as pool:
+                articles = list(tqdm(pool.imap(read_protocol, args, chunksize=chunksize), total=len(args)))
+                # lets the workers exit by themselves (and close their taggers) instead of being terminated
+                pool.close()
+                pool.join()
+        else:
+            init_read_worker(pos_tagger, workers)
+            try:
+                articles = [read_protocol(arg) for arg in tqdm(args)]
+            finally:
+                close_read_worker()
 
         # remove articles that are empty
-        articles = [article for article in articles if article.status]
+        articles = [article for article in articles if article is not None]
+
+        # sentences that are not in the dependency / parse tree caches yet are parsed for all protocols at once,
+        # instead of starting parsers per protocol
+        DepParseStage().run(articles)
+        ParseTreeStage().run(articles)
+
+        # filtering and relation generation are cheap next to sending every protocol to a worker and back, and
+        # the relations are mostly cached, so they are done here
+        for article in tqdm(articles):
+            article.finish()
 
         print("\nloaded {0} articles".format(len(articles)))
+        print("cache {0}".format(format_stats(sum([article.cache_stats for article in articles], Counter()))))
 
         return articles
 
@@ -0,0 +1,33 @@
+from collections import namedtuple
+from unittest import TestCase
+
+from corpus.TagIndex import TagIndex
+
+Tag = namedtuple("Tag", "tag_id, tag_name, start, end, words")
+
+
+class TestTagIndex(TestCase):
+    def setUp(self):
+        self.tags = [Tag('T1', 'Action', 0, 3, ['Add']),
+                     Tag('T2', 'Amount', 4, 8, ['5', 'ml']),
+                     Tag('T3', 'Reagent', 12, 15, ['PBS']),
+                     Tag('T4', 'Modifier', 6, 14, ['ml', 'of', 'PB']),
+                     Tag('T5', 'Reagent', 12, 20, ['PBS', 'to'])]
+        self.index = TagIndex(self.tags)
+
+    def test_get_by_start(self):
+        self.assertEqual(self.index.get_by_start(4).tag_id, 'T2')
+        self.assertIsNone(self.index.get_by_start(5))
+        # first tag in file order wins when two tags share a start
+        self.assertEqual(self.index.get_by_start(12).tag_id, 'T3')
+
+    def test_overlapping(self):
+        self.assertEqual([t.tag_id for t in self.index.overlapping(7, 13)], ['T2', 'T4', 'T3', 'T5'])
+        self.assertEqual([t.tag_id for t in self.index.overlapping(3, 4)], [])
+
+    def test_contained(self):
+        self.assertEqual([t.tag_id for t in self.index.contained(0, 15)], ['T1', 'T2', 'T4', 'T3'])
+
+    def test_partial(self):
+        self.assertEqual([t.tag_id for t in self.index.partial(4, 8)], ['T4'])
+        self.assertEqual([t.tag_id for t in self.index.at(13)], ['T4', 'T3', 'T5'])
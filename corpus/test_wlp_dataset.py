@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from unittest import TestCase, mock
+
+import numpy as np
+
+import config as cfg
+from corpus.WLPDataset import WLPDataset
+
+
+class Token(object):
+    def __init__(self, word):
+        self.word = word
+
+
+class Protocol(object):
+    # what update() needs of a ProtoFile, one sentence per line of the .txt file
+    def __init__(self, filename):
+        self.filename = filename
+        self.protocol_name = os.path.basename(filename)
+        with open(filename + '.txt', 'r', encoding='utf-8') as f:
+            self.tokens2d = [[Token(word) for word in line.split()] for line in f if line.strip()]
+        self.relations = []
+
+
+def read_protocols(self, gen_features, skip_files, pos_tagger=None, dir_path=None, filenames=None, workers=None,
+                   chunksize=None):
+    if filenames is None:
+        filenames = self.list_filenames(dir_path, skip_files)
+    return [Protocol(filename) for filename in filenames]
+
+
+class Vectors(dict):
+    vector_size = cfg.EMBEDDING_DIM
+
+
+class TestUpdate(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.dir_path = os.path.join(self.tmp_dir, 'protocols')
+        os.mkdir(self.dir_path)
+        self.cwd = os.getcwd()
+        # prepare_embeddings writes its tokenizer output to the working directory
+        os.chdir(self.tmp_dir)
+        self.vectors = Vectors(mix=np.full(cfg.EMBEDDING_DIM, 0.5))
+        patches = [mock.patch.object(WLPDataset, 'read_protocols', read_protocols),
+                   mock.patch.object(WLPDataset, 'load_word2vec', staticmethod(lambda: self.vectors)),
+                   mock.patch.object(cfg, 'OOP_FILEPATH', os.path.join(self.tmp_dir, 'oop.txt'))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.write('protocol_a', "mix the cells")
+        self.write('protocol_b', "spin the cells")
+        self.write('protocol_c', "add the buffer")
+        self.corpus = WLPDataset(min_wcount=2, dir_path=self.dir_path)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, text):
+        for ext, content in [('.txt', text + "\n"), ('.ann', "")]:
+            with open(os.path.join(self.dir_path, name + ext), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+    def names(self):
+        return [os.path.basename(p.filename) for p in self.corpus.protocols]
+
+    def test_nothing_changed(self):
+        self.assertFalse(self.corpus.update())
+        self.assertEqual(self.names(), ['protocol_a', 'protocol_b', 'protocol_c'])
+
+    def test_added_changed_removed(self):
+        word_index = dict(self.corpus.word_index)
+        self.assertEqual(set(self.corpus.word_counts), {'the', 'cells'})
+
+        os.remove(os.path.join(self.dir_path, 'protocol_c.txt'))
+        os.remove(os.path.join(self.dir_path, 'protocol_c.ann'))
+        self.write('protocol_b', "spin the tube")
+        self.write('protocol_d', "mix the tube")
+        self.assertTrue(self.corpus.update())
+
+        self.assertEqual(self.names(), ['protocol_a', 'protocol_b', 'protocol_d'])
+        self.assertEqual([t.word for t in self.corpus.protocols[1].tokens2d[0]], ['spin', 'the', 'tube'])
+        self.assertEqual(sorted(self.corpus.file_hashes), [p.filename for p in self.corpus.protocols])
+
+        # the words of the removed protocol and of the old version of the changed one no longer count
+        self.assertEqual(self.corpus.all_word_counts, Counter({'the': 3, 'mix': 2, 'tube': 2, 'cells': 1, 'spin': 1}))
+        self.assertEqual(set(self.corpus.word_counts), {'the', 'mix', 'tube'})
+
+        # existing words keep their ids, new ones are added after them
+        for word, idx in word_index.items():
+            self.assertEqual(self.corpus.word_index[word], idx)
+        self.assertEqual(sorted(self.corpus.word_index[w] for w in ['mix', 'tube']),
+                         [max(word_index.values()) + 1, max(word_index.values()) + 2])
+        self.assertEqual(self.corpus.embedding_matrix.shape[0], max(self.corpus.word_index.values()) + 1)
+
+        # new words get their pre-trained vector, the others are logged as out of the pre-trained vocabulary
+        np.testing.assert_array_equal(self.corpus.embedding_matrix[self.corpus.word_index['mix']], self.vectors['mix'])
+        with open(cfg.OOP_FILEPATH, 'r') as f:
+            self.assertIn('tube', f.read().split())
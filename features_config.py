@@ -81,8 +81,41 @@ STANFORD_MODEL_FILEPATH = os.path.join(STANFORD_POS_DIR, "models/english-bidirec
 
 GENIA_TAGGER_FILEPATH = os.path.join(CURRENT_DIR, "preprocessing/feature_engineering/geniatagger-3.0.2/geniatagger")
 
-# filepath to the cache to use for the pos tagger during training of the CRF
-POS_TAGGER_CACHE_FILEPATH = os.path.join(CURRENT_DIR, "pos.cache")
+# tagger that generates the pos tags and chunks of the protocols, see preprocessing/feature_engineering/taggers.py.
+# "genia" (geniatagger binary), "nltk" (in process, no external tools) or "stanford" (stanford pos tagger, no chunks)
+POS_TAGGER_BACKEND = "genia"
+
+# replaces the geniatagger, the stanford pos tagger and the stanford parsers with the local stand-ins of
+# preprocessing/standin_tools.py, which need no binaries or network and take a fixed time. For benchmarking the
+# preprocessing pipeline offline only.
+USE_STANDIN_TOOLS = False
+# seconds a stand-in takes to start (per tagger process / parser JVM it stands in for), and per sentence
+STANDIN_STARTUP_LATENCY = 2.0
+STANDIN_SENTENCE_LATENCY = 0.005
+
+# number of geniatagger processes that tag the sentences of a protocol in parallel, in each worker process of
+# cfg.READ_WORKERS. None splits half of the cores between the read workers, so that there are about cores / 2
+# taggers in total.
+GENIA_TAGGER_WORKERS = None
+
+# tool versions, part of the cache keys of the artifacts each tool generates. Changing a version invalidates the
+# cached pos tags, dependency graphs and parse trees of that tool.
+GENIA_TAGGER_VERSION = os.path.basename(os.path.dirname(GENIA_TAGGER_FILEPATH))
+STANFORD_POS_VERSION = "{0}:{1}".format(os.path.basename(STANFORD_POS_JAR_FILEPATH),
+                                        os.path.basename(STANFORD_MODEL_FILEPATH))
+STANFORD_PARSER_VERSION = os.path.basename(STANFORD_PARSER_MODEL_JAR)
+
+# filepath to the sentence level cache of the stanford and genia pos tags (see preprocessing/tag_cache.py)
+POS_TAGGER_CACHE_FILEPATH = os.path.join(CURRENT_DIR, "results/pickles/pos_tags.sqlite")
+
+# max number of tagged sentences kept in the pos tag cache, the least recently used ones are evicted first
+POS_TAGGER_CACHE_SIZE = 1000000
+
+# max number of (word, wordnet pos) pairs whose lemma features are kept in memory
+LEMMA_CACHE_SIZE = 200000
+
+# filepath to the persisted lemma feature cache (see LemmatizerFeatures in preprocessing/feature_engineering/features.py)
+LEMMA_CACHE_FILEPATH = os.path.join(CURRENT_DIR, "results/pickles/lemmas.p")
 
 # filepath to the w2v clusters file as genreated by the word2vec tool
 W2V_CLUSTERS_FILEPATH = os.path.join(CURRENT_DIR, "preprocessing/output_word2vec.txt")
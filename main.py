@@ -267,12 +267,23 @@ def test(name, data, tag_idx, model):
 
 
 def dataset_prep(loadfile=None, savefile=None):
+    # loadfile / savefile are either a corpus store directory (see corpus/CorpusStore.py), or a pickle of the
+    # whole corpus (paths ending in .p)
     start_time = time.time()
 
     if loadfile and os.path.exists(loadfile):
         print("Loading corpus ...")
-        corpus = pickle.load(open(loadfile, "rb"))
+        if os.path.isdir(loadfile):
+            corpus = WLPDataset.load(loadfile)
+        else:
+            corpus = pickle.load(open(loadfile, "rb"))
+        # only the protocols that were added, changed or removed since the corpus was saved are processed
+        updated = cfg.INCREMENTAL_BUILD and corpus.update()
         corpus.gen_data(cfg.PER)
+        # saved after gen_data, which finds the out of vocabulary words of the updated vocabulary
+        if updated:
+            print("Saving updated corpus ...")
+            save_corpus(corpus, loadfile)
     else:
         print("Loading Data ...")
         corpus = WLPDataset(gen_ent_feat=True, gen_rel_feat=True, min_wcount=cfg.MIN_WORD_COUNT,
@@ -281,7 +292,7 @@ def dataset_prep(loadfile=None, savefile=None):
 
         if savefile:
             print("Saving corpus and embedding matrix ...")
-            pickle.dump(corpus, open(savefile, "wb"))
+            save_corpus(corpus, savefile)
 
     end_time = time.time()
     print("Ready. Input Process time: {0}".format(end_time - start_time))
@@ -289,6 +300,13 @@ def dataset_prep(loadfile=None, savefile=None):
     return corpus
 
 
+def save_corpus(corpus, savefile):
+    if savefile.endswith(".p"):
+        pickle.dump(corpus, open(savefile, "wb"))
+    else:
+        corpus.save(savefile)
+
+
 def multi_batchify(samples):
     samples = sorted(samples, key=lambda s: len(s.SENT), reverse=True)
 
@@ -416,7 +434,7 @@ def main(nrun=1):
     cfg.DEP_WORD_FEATURE = "No"
     cfg.LM_GAMMA = args.lm_gamma
     for run in range(nrun):
-        dataset = dataset_prep(loadfile=cfg.DB)
+        dataset = dataset_prep(loadfile=cfg.CORPUS_STORE_DIR, savefile=cfg.CORPUS_STORE_DIR)
         cfg.CATEGORIES = len(dataset.tag_idx.keys()) + 2  # +2 for start and end tags of a seq
         dataset.tag_idx['<s>'] = len(dataset.tag_idx.keys())
         dataset.tag_idx['</s>'] = len(dataset.tag_idx.keys())
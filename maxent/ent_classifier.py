@@ -7,11 +7,11 @@ import time
 
 import pickle
 from sklearn.linear_model import LogisticRegression, LogisticRegressionCV
-from sklearn.preprocessing import OneHotEncoder
 
 import config as cfg
 from corpus.WLPDataset import WLPDataset
 from postprocessing.evaluator import Evaluator
+from preprocessing.feature_engineering.sparse_features import family
 import numpy as np
 
 
@@ -44,16 +44,13 @@ def to_categorical(dataset, i, bio=False):
 
 
 def extract_data(start, end, dataset, feat):
-    columns = dataset.f_df.columns.values
-    df = dataset.f_df[[j for i in feat for j in columns if i in j]]
+    # the one hot columns of the ablation feature set, sliced out of the feature matrix of the dataset
+    columns = dataset.featurizer.columns(feat)
     print("Current ablation feature set:")
-    print(list(df.columns.values))
-    enc = OneHotEncoder()
-    enc.fit(df.as_matrix())
+    print([c for c in dataset.featurizer.groups if family(c) in feat])
     w = list(chain.from_iterable(dataset.tokens2d[start:end]))
     w = [token.word for token in w]
-    x = df[dataset.cut_list[start]:dataset.cut_list[end]]
-    x = enc.transform(x.as_matrix())
+    x = dataset.f_matrix[dataset.cut_list[start]:dataset.cut_list[end]][:, columns]
     y = list(
         chain.from_iterable([to_categorical(dataset, item, bio=True) for item in range(start, end)]))
     return x, w, y
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Content addressed pickle cache for preprocessing artifacts (pos tags, dependency graphs, parse trees, ...)."""
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import Counter
+
+
+class ArtifactCache(object):
+    """Pickle cache keyed on a hash of the input and the tool/version that produced the artifact.
+
+    A changed text, tokenization or tool version gives a new key, so stale artifacts are never loaded and only
+    the inputs that actually changed are recomputed. Files are written to a temporary file first and then renamed
+    into place, so concurrent writers never leave a half written artifact behind (the last rename wins, and both
+    writers produced the same artifact for the same key).
+    """
+
+    def __init__(self, cache_dir, tool, version, stats=None):
+        """
+        Args:
+            cache_dir: directory in which the pickles are stored.
+            tool: name of the tool that produces the artifacts, e.g. "genia".
+            version: version string of the tool, changing it invalidates all artifacts of the tool.
+            stats: optional Counter that is updated with "<tool> hit", "<tool> miss" counts, so that several caches
+                can report into the same counter.
+        """
+        self.cache_dir = cache_dir
+        self.tool = tool
+        self.version = version
+        self.stats = stats if stats is not None else Counter()
+
+    def key(self, inputs):
+        """Returns a stable hash of `inputs` (anything with a deterministic repr, e.g. lists of strings)."""
+        h = hashlib.sha1()
+        h.update("{0}\0{1}\0".format(self.tool, self.version).encode('utf-8'))
+        h.update(repr(inputs).encode('utf-8'))
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.p')
+
+    def load(self, key):
+        """Returns the artifact stored under `key`. Raises KeyError if there is no (readable) artifact."""
+        try:
+            with open(self.path(key), 'rb') as f:
+                value = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, FileNotFoundError):
+            self.stats[self.tool + " miss"] += 1
+            raise KeyError(key)
+
+        self.stats[self.tool + " hit"] += 1
+        return value
+
+    def save(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_or_compute(self, inputs, compute):
+        """Returns the cached artifact for `inputs`, or computes it with `compute()` and caches it."""
+        key = self.key(inputs)
+        try:
+            return self.load(key)
+        except KeyError:
+            value = compute()
+            self.save(key, value)
+            return value
+
+
+def format_stats(stats):
+    return ", ".join("{0}: {1}".format(k, v) for k, v in sorted(stats.items()))
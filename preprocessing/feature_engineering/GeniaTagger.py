@@ -1,8 +1,12 @@
+import atexit
 import io
 import math
 import os
 import subprocess
 import tarfile
+import tempfile
+import threading
+from queue import Empty, Queue
 
 import psutil
 import requests
@@ -23,8 +27,18 @@ class Tag(object):
 
 class GeniaTagger(object):
     """
+    Wrapper around the geniatagger binary.
+
+    parse_through_file runs one tagger process per call. tag_sents and parse instead talk to one long lived tagger
+    process (the session) over stdin/stdout, so the tagger loads its models once per run instead of once per
+    protocol. The session is started on first use, restarted if the tagger dies, and shut down on close() or at exit.
     """
 
+    name = "genia"
+
+    # how often the session is restarted for the same sentence before giving up
+    MAX_RESTARTS = 3
+
     def __init__(self, path_to_tagger):
         """
 
@@ -33,10 +47,98 @@ class GeniaTagger(object):
         """
         self._path_to_tagger = path_to_tagger
         self._dir_to_tagger = os.path.dirname(path_to_tagger)
+        self._tagger = None
+        self._close_at_exit = False
+        self.version = os.path.basename(self._dir_to_tagger)
 
         if not os.path.isfile(self._path_to_tagger):
             self.dl_and_make()
 
+    def __getstate__(self):
+        # a running process cannot be pickled, each process (e.g. each worker of a Pool) starts its own session
+        state = self.__dict__.copy()
+        state['_tagger'] = None
+        # exit handlers are per process, the unpickled copy registers its own
+        state['_close_at_exit'] = False
+        return state
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        """Starts the tagger session, and blocks until the tagger has loaded its models."""
+        if self.is_alive():
+            return
+
+        # stderr only carries the model loading progress, it is dropped so that it never fills up its pipe
+        self._tagger = subprocess.Popen(self._path_to_tagger, cwd=self._dir_to_tagger,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        universal_newlines=True, encoding="utf-8", bufsize=1)
+        # once per session object, restarts reuse it
+        if not self._close_at_exit:
+            atexit.register(self.close)
+            self._close_at_exit = True
+
+        # the tagger only answers once its models are loaded, so a tagged probe sentence means it is ready
+        if self.__tag_line("ready") is None:
+            raise RuntimeError("geniatagger at {0} exited while loading its models".format(self._path_to_tagger))
+
+    def is_alive(self):
+        return self._tagger is not None and self._tagger.poll() is None
+
+    def close(self):
+        """Shuts the tagger session down, killing the tagger if it does not exit by itself."""
+        if self._tagger is None:
+            return
+
+        tagger, self._tagger = self._tagger, None
+        try:
+            tagger.stdin.close()
+            tagger.wait(timeout=5)
+        except (subprocess.TimeoutExpired, OSError):
+            if tagger.poll() is None:
+                self.kill(tagger.pid)
+        finally:
+            tagger.stdout.close()
+
+    def __tag_line(self, line):
+        # writes one sentence and reads the tagged tokens up to the blank line that ends the sentence.
+        # returns None if the tagger died.
+        try:
+            self._tagger.stdin.write(line + "\n")
+            self._tagger.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+
+        tags = []
+        while True:
+            r = self._tagger.stdout.readline()
+            if not r:
+                return None
+            if r == "\n":
+                return tags
+            tags.append(tuple(r.rstrip("\n").split("\t")))
+
+    def __tag_sent(self, sent):
+        # the tagger reads line by line, and an empty line would not get a sentence back
+        sent = " ".join(sent.split())
+        if not sent:
+            return []
+
+        for _ in range(self.MAX_RESTARTS + 1):
+            if not self.is_alive():
+                self.close()
+                self.start()
+            tags = self.__tag_line(sent)
+            if tags is not None:
+                return tags
+
+        raise RuntimeError("geniatagger keeps exiting on sentence: {0}".format(sent))
+
     def dl_and_make(self):
         print("Downloading genia tagger ...")
         r = requests.get("http://www.nactem.ac.uk/tsujii/GENIA/tagger/geniatagger-3.0.2.tar.gz", stream=True)
@@ -68,29 +170,49 @@ class GeniaTagger(object):
         process.kill()
 
     def parse_through_file(self, sents):
-        with open("temp.txt", "w", encoding="utf-8") as f:
-            for sent in sents:
-                f.write(sent + "\n")
-
-        in_file = open("temp.txt", "r", encoding="utf-8")
-        out_file = open("out.txt", "w", encoding="utf-8")
-        subprocess.call(self._path_to_tagger, cwd=self._dir_to_tagger,
-                        stdin=in_file, stdout=out_file,
-                        stderr=subprocess.PIPE)
+        # temp files go to a private directory, so that several taggers (e.g. one per worker process) can run
+        # side by side without overwriting each other's input and output.
+        with tempfile.TemporaryDirectory(prefix="genia") as tmp_dir:
+            in_path = os.path.join(tmp_dir, "temp.txt")
+            out_path = os.path.join(tmp_dir, "out.txt")
+            with open(in_path, "w", encoding="utf-8") as f:
+                for sent in sents:
+                    f.write(sent + "\n")
+
+            with open(in_path, "r", encoding="utf-8") as in_file, open(out_path, "w", encoding="utf-8") as out_file:
+                subprocess.call(self._path_to_tagger, cwd=self._dir_to_tagger,
+                                stdin=in_file, stdout=out_file,
+                                stderr=subprocess.PIPE)
+            ret_sents = []
+            sent = []
+
+            with open(out_path, "r", encoding="utf-8") as out:
+                for line in out.readlines():
+                    if line == '\n':
+                        ret_sents.append(sent)
+                        sent = []
+                    else:
+                        word_tag = Tag(line.split("\t"))
+                        sent.append((word_tag.word, word_tag.pos, word_tag.chunk))
+
+        return ret_sents
+
+    def tag_sents(self, sents):
+        """Tags sentences through the tagger session.
+
+        Arguments:
+        - `sents`: list of sentences, each a string of space separated words.
+
+        Returns a list of [(word, pos, chunk), ...] per sentence, like parse_through_file.
+        """
         ret_sents = []
-        sent = []
-
-        with open("out.txt", "r", encoding="utf-8") as out:
-            for line in out.readlines():
-                if line == '\n':
-                    ret_sents.append(sent)
-                    sent = []
-                else:
-                    word_tag = Tag(line.split("\t"))
-                    sent.append((word_tag.word, word_tag.pos, word_tag.chunk))
-
-        in_file.close()
-        out_file.close()
+        for tags in self.parse(sents):
+            sent = []
+            for t in tags:
+                word_tag = Tag(t)
+                sent.append((word_tag.word, word_tag.pos, word_tag.chunk))
+            ret_sents.append(sent)
+
         return ret_sents
 
     def parse(self, sents):
@@ -98,15 +220,102 @@ class GeniaTagger(object):
 
         Arguments:
         - `self`:
-        - `text`:
+        - `sents`: list of sentences, each a string of space separated words.
+
+        Returns a list of [(word, base, pos, chunk, ner), ...] per sentence.
         """
+        self.start()
+        return [self.__tag_sent(oneline) for oneline in sents]
 
-        results = list()
 
-        for oneline in tqdm(sents):
-            self._tagger.stdin.write((oneline + "\n").encode("utf-8"))
-            r = self._tagger.stdout.readline()[:-1]
-            if not r:
-                break
-            results.append(tuple(r.split('\t')))
+class GeniaTaggerPool(object):
+    """
+    Several GeniaTagger sessions that tag sentences in parallel.
+
+    Sentences go into a shared work queue, and one thread per session takes the next sentence as soon as its tagger
+    is done with the previous one, so a slow sentence does not hold up the others. The threads only wait on the
+    tagger processes, which do the actual work on their own cores. Results are put back in the order of the input,
+    so the pool is a drop in replacement for a GeniaTagger.
+    """
+
+    def __init__(self, path_to_tagger, size, session=GeniaTagger):
+        """
+
+        Arguments:
+        - `path_to_tagger`:
+        - `size`: number of tagger processes.
+        - `session`: class of the sessions, called with `path_to_tagger` (e.g. standin_tools.StandinTagger).
+        """
+        self._path_to_tagger = path_to_tagger
+        self._session = session
+        self.size = max(1, size)
+        self._taggers = None
+
+        # downloads and builds the tagger once, before the sessions start
+        tagger = session(path_to_tagger)
+        self.name = tagger.name
+        self.version = tagger.version
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_taggers'] = None
+        return state
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        if self._taggers is None:
+            self._taggers = [self._session(self._path_to_tagger) for _ in range(self.size)]
+
+        # the taggers load their models in parallel
+        threads = [threading.Thread(target=tagger.start) for tagger in self._taggers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def close(self):
+        if self._taggers is None:
+            return
+        for tagger in self._taggers:
+            tagger.close()
+        self._taggers = None
+
+    def tag_sents(self, sents):
+        """Tags sentences on all taggers of the pool, returns the same as GeniaTagger.tag_sents."""
+        if self._taggers is None:
+            self.start()
+
+        work = Queue()
+        for i, sent in enumerate(sents):
+            work.put((i, sent))
+
+        results = [None] * len(sents)
+        errors = []
+
+        def run(tagger):
+            while not errors:
+                try:
+                    i, sent = work.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results[i] = tagger.tag_sents([sent])[0]
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(tagger,)) for tagger in self._taggers[:len(sents)]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
         return results
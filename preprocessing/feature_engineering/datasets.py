@@ -4,9 +4,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import glob
 import os
-import re
 # from unidecode import unidecode
 from collections import Counter, namedtuple, OrderedDict
+from functools import lru_cache
+
+import numpy as np
 
 import features_config as cfg
 from corpus.ProtoFile import ProtoFile
@@ -16,6 +18,107 @@ from corpus.ProtoFile import ProtoFile
 Coder = namedtuple('Coder', ["path", "name"])
 
 
+def to_pair(feature_value):
+    """Returns the (name, value) pair of a feature value.
+
+    Feature generators return (name, value) pairs, the older "name=value" strings are split at their first "=".
+    """
+    if isinstance(feature_value, tuple):
+        return feature_value
+    name, _, value = feature_value.partition('=')
+    return name, value
+
+
+@lru_cache(maxsize=None)
+def column_name(diff, name):
+    """Name of the column of feature `name` of the token `diff` positions away, e.g. "-1:pos"."""
+    return "%d:%s" % (diff, name)
+
+
+def skipchain_dict(items, word_index, skipchain_left, skipchain_right):
+    """Returns an OrderedDict of column name -> value of the features of items[word_index] and its neighbours.
+
+    The features of each neighbour are renamed to the columns of its offset, their values are not touched.
+    """
+    of_dict = OrderedDict()
+    start = max(0, word_index - skipchain_left)
+    end = min(len(items), word_index + 1 + skipchain_right)
+    for i, item in enumerate(items[start:end]):
+        diff = start + i - word_index
+        for name, value in item.feature_values:
+            of_dict[column_name(diff, name)] = value
+
+    return of_dict
+
+
+def feature_columns(items):
+    """Returns the features of `items` (tokens or links, after apply_features) as a column table.
+
+    The table is an OrderedDict of feature name -> list with the value of each item, None where an item does not
+    have the feature.
+    """
+    columns = OrderedDict()
+    for i, item in enumerate(items):
+        for name, value in item.feature_values:
+            if name not in columns:
+                columns[name] = [None] * len(items)
+            columns[name][i] = value
+
+    return columns
+
+
+def concat_columns(tables, lengths):
+    """Stacks column tables (see feature_columns) of `lengths` rows each into one table of object arrays.
+
+    Rows of tables that do not have a column get None in it.
+    """
+    offsets = np.cumsum([0] + list(lengths))
+    columns = OrderedDict()
+    for table, start in zip(tables, offsets):
+        for name, values in table.items():
+            if name not in columns:
+                columns[name] = np.full(offsets[-1], None, dtype=object)
+            columns[name][start:start + len(values)] = values
+
+    return columns
+
+
+def shift_column(column, sent_ids, diff):
+    """Returns `column` shifted so that each row gets the value of the row `diff` rows away (None if that row is in
+    another sentence, or out of the table)."""
+    n = len(column)
+    src = np.arange(n) + diff
+    valid = (src >= 0) & (src < n)
+    valid[valid] = sent_ids[src[valid]] == sent_ids[valid]
+    shifted = np.full(n, None, dtype=object)
+    shifted[valid] = column[src[valid]]
+    return shifted
+
+
+def expand_skipchain(columns, sent_ids, skipchain_left, skipchain_right):
+    """Vectorized version of the skip-chain of get_feature_values_list, for whole sentences / protocols at once.
+
+    Args:
+        columns: column table (see concat_columns), one row per token, of any number of sentences.
+        sent_ids: array with the sentence of each row, neighbours are only taken from the same sentence.
+        skipchain_left: how many rows to the left are included, see EntityWindow.get_feature_values_list.
+        skipchain_right: like skipchain_left, but to the right side.
+    Returns:
+        OrderedDict of column name ("-1:pos", "0:pos", ...) -> object array. Columns that would be all None are
+        left out, so the columns are the same as the keys of the dicts of get_feature_values_list.
+    """
+    sent_ids = np.asarray(sent_ids)
+    expanded = OrderedDict()
+    for diff in range(-skipchain_left, skipchain_right + 1):
+        for name, column in columns.items():
+            column = np.asarray(column, dtype=object)
+            shifted = column if diff == 0 else shift_column(column, sent_ids, diff)
+            if np.not_equal(shifted, None).any():
+                expanded[column_name(diff, name)] = shifted
+
+    return expanded
+
+
 def split_to_chunks(of_list, chunk_size):
     """Splits a list to smaller chunks.
     Args:
@@ -251,7 +354,7 @@ class EntityWindow:
 
     def apply_features(self, features):
         """Applies a list of feature generators to the tokens of this window.
-        Each feature generator will then generate a list of featue values (as strings) for each
+        Each feature generator will then generate a list of featue values ((name, value) pairs) for each
         token. Each of these lists can be empty. The lists are saved in the tokens and can later
         on be requested multiple times without the generation overhead (which can be heavy for
         some features).
@@ -263,55 +366,53 @@ class EntityWindow:
         # 1st dimension: Feature (class)
         # 2nd dimension: token
         # 3rd dimension: values (for this token and feature, usually just one value, sometimes more,
-        #                        e.g. "w2vc=975")
+        #                        e.g. ("w2vc", "975"))
         features_values = [feature.convert_window(self) for feature in features]
 
         for token in self.tokens:
             token.feature_values = []
 
         # After this, each self.token.feature_values will be a simple list
-        # of feature values, e.g. ["w2v=875", "bc=48", ...]
+        # of (name, value) pairs, e.g. [("w2v", "875"), ("bc", "48"), ...]
         for feature_value in features_values:
             assert isinstance(feature_value, list)
             assert len(feature_value) == len(self.tokens), (len(feature_value), len(self.tokens))
             for token_idx in range(len(self.tokens)):
-                self.tokens[token_idx].feature_values.extend(feature_value[token_idx])
+                self.tokens[token_idx].feature_values.extend(to_pair(value) for value in feature_value[token_idx])
 
     @staticmethod
     def convert_list_2_dict(of_list):
-        of_dict = OrderedDict()
-        for item in of_list:
-            w1, w2 = re.search('([^=]*)=(.*)', item).groups()
-            of_dict[w1] = w2
-
-        return of_dict
+        return OrderedDict(to_pair(item) for item in of_list)
 
     def get_feature_values_list(self, word_index, skipchain_left, skipchain_right):
-        """Generates a list of feature values (strings) for one token/word in the window.
+        """Generates the feature values of one token/word in the window, with its neighbours' ones.
 
         Args:
             word_index: The index of the word/token for which to generate the featueres.
             skipchain_left: How many words to the left will be included among the features of
-                the requested word. E.g. a value of 1 could lead to a list like
-                ["-1:w2vc=123", "-1:l=30", "0:w2vc=18", "0:l=4"].
+                the requested word. E.g. a value of 1 could lead to a dict like
+                {"-1:w2vc": "123", "-1:l": "30", "0:w2vc": "18", "0:l": "4"}.
             skipchain_right: Like skipchain_left, but to the right side.
         Returns:
-            List of strings (list of feature values).
+            OrderedDict of column name -> feature value.
         """
         assert word_index >= 0
         assert word_index < len(self.tokens)
 
-        all_feature_values = []
+        return skipchain_dict(self.tokens, word_index, skipchain_left, skipchain_right)
+
+    def feature_columns(self):
+        """Returns the features of all the tokens of the window as a column table, see feature_columns()."""
+        return feature_columns(self.tokens)
 
-        start = max(0, word_index - skipchain_left)
-        end = min(len(self.tokens), word_index + 1 + skipchain_right)
-        for i, token in enumerate(self.tokens[start:end]):
-            diff = start + i - word_index
-            feature_values = ["%d:%s" % (diff, feature_value)
-                              for feature_value in token.feature_values]
-            all_feature_values.extend(feature_values)
-        all_feature_values = self.convert_list_2_dict(all_feature_values)
-        return all_feature_values
+    def get_feature_columns(self, skipchain_left, skipchain_right):
+        """Column version of get_feature_values_list, the features of every token of the window at once.
+
+        Returns:
+            OrderedDict of column name -> object array with a row for each token.
+        """
+        return expand_skipchain(self.feature_columns(), np.zeros(len(self.tokens), dtype=int),
+                                skipchain_left, skipchain_right)
 
     def get_labels(self):
         """Returns the labels of all tokens as a list.
@@ -340,7 +441,7 @@ class RelationWindow:
 
     def apply_features(self, features):
         """Applies a list of feature generators to the tokens of this window.
-        Each feature generator will then generate a list of featue values (as strings) for each
+        Each feature generator will then generate a list of featue values ((name, value) pairs) for each
         token. Each of these lists can be empty. The lists are saved in the tokens and can later
         on be requested multiple times without the generation overhead (which can be heavy for
         some features).
@@ -352,52 +453,47 @@ class RelationWindow:
         # 1st dimension: Feature (class)
         # 2nd dimension: token
         # 3rd dimension: values (for this token and feature, usually just one value, sometimes more,
-        #                        e.g. "w2vc=975")
+        #                        e.g. ("w2vc", "975"))
         features_values = [feature.convert_window(self) for feature in features]
 
         for link in self.relations:
             link.feature_values = []
 
         # After this, each self.token.feature_values will be a simple list
-        # of feature values, e.g. ["w2v=875", "bc=48", ...]
+        # of (name, value) pairs, e.g. [("w2v", "875"), ("bc", "48"), ...]
         for feature_value in features_values:
             assert isinstance(feature_value, list)
             assert len(feature_value) == len(self.relations), (len(feature_value), len(self.relations))
             for link_idx in range(len(self.relations)):
-                self.relations[link_idx].feature_values.extend(feature_value[link_idx])
+                self.relations[link_idx].feature_values.extend(to_pair(value) for value in feature_value[link_idx])
 
     def get_feature_values_list(self, word_index, skipchain_left, skipchain_right):
-        """Generates a list of feature values (strings) for one token/word in the window.
+        """Generates the feature values of one token/word in the window, with its neighbours' ones.
 
         Args:
             word_index: The index of the word/token for which to generate the featueres.
             skipchain_left: How many words to the left will be included among the features of
-                the requested word. E.g. a value of 1 could lead to a list like
-                ["-1:w2vc=123", "-1:l=30", "0:w2vc=18", "0:l=4"].
+                the requested word. E.g. a value of 1 could lead to a dict like
+                {"-1:w2vc": "123", "-1:l": "30", "0:w2vc": "18", "0:l": "4"}.
             skipchain_right: Like skipchain_left, but to the right side.
         Returns:
-            List of strings (list of feature values).
+            OrderedDict of column name -> feature value.
         """
         assert word_index >= 0
         assert word_index < len(self.relations)
 
-        all_feature_values = []
+        return skipchain_dict(self.relations, word_index, skipchain_left, skipchain_right)
 
-        start = max(0, word_index - skipchain_left)
-        end = min(len(self.relations), word_index + 1 + skipchain_right)
-        for i, link in enumerate(self.relations[start:end]):
-            diff = start + i - word_index
-            feature_values = ["%d:%s" % (diff, feature_value)
-                              for feature_value in link.feature_values]
-            all_feature_values.extend(feature_values)
-        all_feature_values = self.__list_2_dict(all_feature_values)
-        return all_feature_values
+    def feature_columns(self):
+        """Returns the features of all the links of the window as a column table, see feature_columns()."""
+        return feature_columns(self.relations)
 
-    @staticmethod
-    def __list_2_dict(of_list):
-        of_dict = OrderedDict()
-        for item in of_list:
-            w1, w2 = re.search('([^=]*)=(.*)', item).groups()
-            of_dict[w1] = w2
+    def get_feature_columns(self, skipchain_left, skipchain_right):
+        """Column version of get_feature_values_list, the features of every link of the window at once.
+
+        Returns:
+            OrderedDict of column name -> object array with a row for each link.
+        """
+        return expand_skipchain(self.feature_columns(), np.zeros(len(self.relations), dtype=int),
+                                skipchain_left, skipchain_right)
 
-        return of_dict
@@ -2,7 +2,7 @@
 """
 Contains:
     1. Various classes (feature generators) to convert windows (of words/tokens) to feature values.
-       Each feature value is a string, e.g. "starts_with_uppercase=1", "brown_cluster=123".
+       Each feature value is a (name, value) pair of strings, e.g. ("starts_with_uppercase", "1").
     2. A method to create all feature generators.
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
@@ -12,15 +12,21 @@ import sys
 from itertools import chain, tee
 
 import copy
+import os
+from collections import OrderedDict
+
+import nltk
 from nltk import WordNetLemmatizer
 from nltk.corpus import wordnet
 from nltk.parse.stanford import StanfordDependencyParser
 
 # All capitalized constants come from this file
 import features_config as cfg
+from corpus.DepIndex import DepIndex
 
 from preprocessing.feature_engineering.pos import PosTagger
 from preprocessing.feature_engineering.unigrams import Unigrams
+from preprocessing.utils import quickload, quicksave
 
 
 def create_features(articles, verbose=True):
@@ -77,11 +83,17 @@ def create_features(articles, verbose=True):
     # print_if_verbose("Loading POS-Tagger...")
 
 
+    # wordnet lookups for all the (word, pos) pairs of the corpus, once per pair instead of once per token
+    print_if_verbose("Precomputing lemmas...")
+    lemmatizer = LemmatizerFeatures(ug_all_top, cache_filepath=cfg.LEMMA_CACHE_FILEPATH)
+    lemmatizer.precompute(articles)
+    lemmatizer.save_cache()
+
     # create feature generators
     result = [
         # EntityTypeFeatures(),
         # NearestEntityFeatures(),
-        LemmatizerFeatures( ug_all_top),
+        lemmatizer,
         # DepGraphFeatures(),
         # DepTypeFeatures(),
         # BrownClusterFeature(brown),
@@ -101,21 +113,21 @@ class EntityTypeFeatures(object):
         pass
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
             l = token.label
             if "Action-Verb" in l:
                 l = "O"
-            result.append(["label=%s" % l])
+            result.append([("label", str(l))])
         return result
 
 
@@ -138,14 +150,14 @@ class NearestEntityFeatures(object):
                     return tokens[i + w]
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for i, token in enumerate(window.tokens):
@@ -154,7 +166,7 @@ class NearestEntityFeatures(object):
                 l = '#'
             else:
                 l = res.label
-            result.append(["near=%s" % l])
+            result.append([("near", str(l))])
         return result
 
 
@@ -175,15 +187,11 @@ class DepTypeFeatures(object):
         return "#"
 
     def convert_window(self, window):
-        dep_graph = window.dep
-        # dep_graph = self.dependency_parse(window)
-
-        t = dep_graph.triples()
-        t = list(t)
+        dep_index = DepIndex(window.dep)
         result = []
         for token in window.tokens:
-            rel = self.get_rel(t, token.word)
-            result.append(["rel={0}".format(rel)])
+            rel = dep_index.get_rel(token.word)
+            result.append([("rel", str(rel))])
 
         return result
 
@@ -212,15 +220,13 @@ class DepGraphFeatures(object):
         return gov
 
     def convert_window(self, window):
-        dep_graph = window.dep
-        t = dep_graph.triples()
-        t = list(t)
+        dep_index = DepIndex(window.dep)
         result = []
         for token in window.tokens:
-            dep = self.get_deps(t, token.word)
-            gov = self.get_govs(t, token.word)
+            dep = dep_index.get_dep(token.word)
+            gov = dep_index.get_gov(token.word)
 
-            word_list = ["dep={0}".format(dep[0]), "gov={0}".format(gov[0])]
+            word_list = [("dep", str(dep[0])), ("gov", str(gov[0]))]
             result.append(word_list)
 
         return result
@@ -229,9 +235,35 @@ class DepGraphFeatures(object):
 class LemmatizerFeatures(object):
     # syn + lemma
 
-    def __init__(self, unigrams):
+    def __init__(self, unigrams, cache_size=cfg.LEMMA_CACHE_SIZE, cache_filepath=None):
+        """
+        Args:
+            unigrams: Unigrams, only words among them get lemma features.
+            cache_size: max number of (word, wordnet pos) pairs whose lemmas are kept in memory.
+            cache_filepath: optional file the cache is loaded from, and saved to by save_cache(). A cache saved
+                with another version of nltk or wordnet is not used.
+        """
         self.unigrams = unigrams
         self.wordnet_lemmatizer = WordNetLemmatizer()
+        self.cache_size = cache_size
+        self.cache_filepath = cache_filepath
+        self._version = None
+        # (word, wordnet pos) -> lemma feature value, least recently used first
+        self.lemma_cache = OrderedDict()
+        if cache_filepath is not None and os.path.isfile(cache_filepath):
+            saved = quickload(cache_filepath)
+            if isinstance(saved, dict) and saved.get('version') == self.version:
+                self.lemma_cache.update(saved['lemmas'])
+                # the file may have been saved with a larger cache_size
+                while len(self.lemma_cache) > self.cache_size:
+                    self.lemma_cache.popitem(last=False)
+
+    @property
+    def version(self):
+        """Version of the lemmatizer, the lemmas of a saved cache are only used by the same version."""
+        if self._version is None:
+            self._version = "{0}:{1}".format(nltk.__version__, wordnet.get_version())
+        return self._version
 
     @staticmethod
     def is_noun(tag):
@@ -260,6 +292,39 @@ class LemmatizerFeatures(object):
             return wordnet.VERB
         return wordnet.NOUN
 
+    def lemmas(self, word, pos_tag):
+        """Returns the joined lemma names of the wordnet synsets of the lemma of word, memoized per
+        (word, wordnet pos)."""
+        key = (word, self.convert_tag(pos_tag))
+        if key in self.lemma_cache:
+            self.lemma_cache.move_to_end(key)
+            return self.lemma_cache[key]
+
+        the_word = self.wordnet_lemmatizer.lemmatize(word, pos=key[1])
+        synonyms = wordnet.synsets(the_word, pos=key[1])
+        # sorted, so that the value does not depend on the set order of the process that computed it
+        lemmas = "".join(sorted(set(chain.from_iterable([word.lemma_names() for word in synonyms]))))
+
+        self.lemma_cache[key] = lemmas
+        if len(self.lemma_cache) > self.cache_size:
+            self.lemma_cache.popitem(last=False)
+
+        return lemmas
+
+    def precompute(self, articles):
+        """Fills the cache with the lemmas of all the (word, pos) pairs of articles that get lemma features."""
+        for p in articles:
+            for tokens1d, pos_tags in zip(p.tokens2d, p.pos_tags):
+                for token, (_, pos_tag, _) in zip(tokens1d, pos_tags):
+                    if self.token_to_rank(token) != "#":
+                        self.lemmas(token.word, pos_tag)
+
+    def save_cache(self, cache_filepath=None):
+        cache_filepath = cache_filepath or self.cache_filepath
+        if cache_filepath is not None:
+            os.makedirs(os.path.dirname(cache_filepath), exist_ok=True)
+            quicksave({'version': self.version, 'lemmas': dict(self.lemma_cache)}, cache_filepath)
+
     def convert_window(self, window):
         # print("lemma ...", end=" ")
         sys.stdout.flush()
@@ -271,13 +336,11 @@ class LemmatizerFeatures(object):
             # pos_tag = (word, pos, chunk)
             for token, (_, pos_tag, _) in zip(window.tokens, pos_tags):
                 if self.token_to_rank(token) != "#":
-                    the_word = self.wordnet_lemmatizer.lemmatize(token.word, pos=self.convert_tag(pos_tag))
-                    synonyms = wordnet.synsets(the_word, pos=self.convert_tag(pos_tag))
-                    lemmas = set(chain.from_iterable([word.lemma_names() for word in synonyms]))
+                    lemmas = self.lemmas(token.word, pos_tag)
                 else:
-                    lemmas = ["#"]
+                    lemmas = "#"
 
-                result.append(["lm={0}".format("".join(lemmas))])
+                result.append([("lm", str(lemmas))])
         else:
             orig_str = "|".join([token.word for token in window.tokens])
             pos_str = "|".join([word for word, _, _ in pos_tags])
@@ -312,18 +375,18 @@ class StartsWithUppercaseFeature(object):
         pass
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
-            result.append(["swu=%d" % (int(token.word[:1].istitle()))])
+            result.append([("swu", "%d" % (int(token.word[:1].istitle())))])
         return result
 
 
@@ -339,18 +402,18 @@ class TokenLengthFeature(object):
         self.max_length = max_length
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
-            result.append(["l=%d" % (min(len(token.word), self.max_length))])
+            result.append([("l", "%d" % (min(len(token.word), self.max_length)))])
         return result
 
 
@@ -362,19 +425,19 @@ class ContainsDigitsFeature(object):
         self.regexp_contains_digits = re.compile(r'[0-9]+')
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
             any_digits = self.regexp_contains_digits.search(token.word) is not None
-            result.append(["cD=%d" % (int(any_digits))])
+            result.append([("cD", "%d" % (int(any_digits)))])
         return result
 
 
@@ -386,19 +449,19 @@ class ContainsPunctuationFeature(object):
         self.regexp_contains_punctuation = re.compile(r'[\.\,\:\;\(\)\[\]\?\!]+')
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
             any_punct = self.regexp_contains_punctuation.search(token.word) is not None
-            result.append(["cP=%d" % (int(any_punct))])
+            result.append([("cP", "%d" % (int(any_punct)))])
         return result
 
 
@@ -410,19 +473,19 @@ class OnlyDigitsFeature(object):
         self.regexp_contains_only_digits = re.compile(r'^[0-9]+$')
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
             only_digits = self.regexp_contains_only_digits.search(token.word) is not None
-            result.append(["oD=%d" % (int(only_digits))])
+            result.append([("oD", "%d" % (int(only_digits)))])
         return result
 
 
@@ -434,19 +497,19 @@ class OnlyPunctuationFeature(object):
         self.regexp_contains_only_punctuation = re.compile(r'^[\.\,\:\;\(\)\[\]\?\!]+$')
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
             only_punct = self.regexp_contains_only_punctuation.search(token.word) is not None
-            result.append(["oP=%d" % (int(only_punct))])
+            result.append([("oP", "%d" % (int(only_punct)))])
         return result
 
 
@@ -462,18 +525,18 @@ class W2VClusterFeature(object):
         self.w2v_clusters = w2v_clusters
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
-            result.append(["w2v=%d" % (self.token_to_cluster(token))])
+            result.append([("w2v", "%d" % (self.token_to_cluster(token)))])
         return result
 
     def token_to_cluster(self, token):
@@ -499,18 +562,18 @@ class BrownClusterFeature(object):
         self.brown_clusters = brown_clusters
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
-            result.append(["bc=%d" % (self.token_to_cluster(token))])
+            result.append([("bc", "%d" % (self.token_to_cluster(token)))])
         return result
 
     def token_to_cluster(self, token):
@@ -537,14 +600,14 @@ class BrownClusterBitsFeature(object):
         self.brown_clusters = brown_clusters
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for token in window.tokens:
@@ -576,19 +639,19 @@ class GazetteerFeature(object):
         self.name = name
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         print("gaz ...", end=" ")
         for token in window.tokens:
-            result.append(["g" + self.name + "=%d" % (int(self.is_in_gazetteer(token)))])
+            result.append([("g" + self.name, "%d" % (int(self.is_in_gazetteer(token))))])
         print("done")
         return result
 
@@ -640,19 +703,19 @@ class WordPatternFeature(object):
         ]
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         print("pat ...", end=" ")
         for token in window.tokens:
-            result.append(["wp=%s" % (self.token_to_wordpattern(token))])
+            result.append([("wp", str(self.token_to_wordpattern(token)))])
         print("done")
         return result
 
@@ -690,14 +753,14 @@ class UnigramFeature(object):
         self.unigrams = unigrams
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         # print("unigram ...", end=" ")
@@ -707,7 +770,7 @@ class UnigramFeature(object):
 
         for i in range(len(window.tokens)):
             token = window.tokens[i]
-            result.append(["ng0=%s" % (self.token_to_rank(token))])
+            result.append([("ng0", str(self.token_to_rank(token)))])
 
         # print("done")
         return result
@@ -736,14 +799,14 @@ class BigramFeature(object):
         self.unigrams = unigrams
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         # print("bigram ...", end=" ")
@@ -757,7 +820,7 @@ class BigramFeature(object):
                 word2 = self.token_to_rank(window.tokens[i + 1])
             else:
                 word2 = '#'
-            result.append(["bg={0}{1}".format(word1, word2)])
+            result.append([("bg", "{0}{1}".format(word1, word2))])
 
         # print("done")
         return result
@@ -781,20 +844,20 @@ class PrefixFeature(object):
         pass
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         print("pre ...", end=" ")
         for token in window.tokens:
             prefix = re.sub(r"[^a-zA-ZäöüÄÖÜß\.\,\!\?]", "#", token.word[0:3])
-            result.append(["pf=%s" % (prefix)])
+            result.append([("pf", str(prefix))])
         print("done")
         return result
 
@@ -807,20 +870,20 @@ class SuffixFeature(object):
         pass
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         print("suff ...", end=" ")
         for token in window.tokens:
             suffix = re.sub(r"[^a-zA-ZäöüÄÖÜß\.\,\!\?]", "#", token.word[-3:])
-            result.append(["sf=%s" % (suffix)])
+            result.append([("sf", str(suffix))])
         print("done")
         return result
 
@@ -837,14 +900,14 @@ class POSTagFeature(object):
         self.size = 1
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         # print("pos ...", end=" ")
         sys.stdout.flush()
@@ -856,7 +919,7 @@ class POSTagFeature(object):
         if len(pos_tags) == len(window.tokens):
             # _ is the word
             for pos_tag in pos_tags:
-                result.append(["pos={0}".format(pos_tag[1])])
+                result.append([("pos", str(pos_tag[1]))])
         else:
             orig_str = "|".join([token.word for token in window.tokens])
             pos_str = "|".join([word for word, _, _ in pos_tags])
@@ -905,14 +968,14 @@ class LDATopicFeature(object):
         self.prob_threshold = prob_threshold
 
     def convert_window(self, window):
-        """Converts a EntityWindow object into a list of lists of features, where features are strings.
+        """Converts a EntityWindow object into a list of lists of features, where features are (name, value) pairs.
         Args:
             window: The EntityWindow object (defined in datasets.py) to use.
         Returns:
             List of lists of features.
             One list of features for each token.
             Each list can contain any number of features (including 0).
-            Each feature is a string.
+            Each feature is a (name, value) pair of strings.
         """
         result = []
         for i, token in enumerate(window.tokens):
@@ -2,30 +2,32 @@
 """Class that wraps the Stanford POS tagger."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import os
 from math import ceil
 
 import nltk
-import shelve
-import random
 
 from tqdm import tqdm
 
+from preprocessing.tag_cache import TagCache
+
 
 class PosTagger(object):
     """Class that wraps the Stanford POS tagger.
 
-    This class uses a shelve cache to store generated results. This speeds up the generation
+    This class uses a persistent TagCache to store generated results per sentence. This speeds up the generation
     of training examples, if the identical corpus, window sizes etc. are used.
     """
     def __init__(self, stanford_postagger_jar_filepath, stanford_model_filepath,
-                 cache_filepath=None):
+                 cache_filepath=None, cache_size=1000000):
         """Initialize the Stanford POS tag wrapper.
         Args:
             stanford_postagger_jar_filepath: Filepath to the jar of the stanford tagger,
                 e.g. "/var/foo/bar/stanford-pos-tagger/stanford-postagger-3.2.0.jar".
             stanford_model_filepath: Filepath to the used model for the pos tagger,
                 e.g. "/var/foo/bar/stanford-pos-tagger/models/german-fast.tagger".
-            cache_filepath: Optional filepath to a shelve cache for the LDA results.
+            cache_filepath: Optional filepath to a TagCache for the tagged sentences.
+            cache_size: Max number of sentences kept in the cache.
         """
         self.max_string_length = 2000
         self.min_string_length = 1
@@ -34,9 +36,17 @@ class PosTagger(object):
                                                           stanford_postagger_jar_filepath,
                                                           encoding="utf-8", java_options='-mx3000m')
 
-        self.cache_synch_prob = 2 # in percent, 1 to 100
         self.cache_filepath = cache_filepath
-        self.cache = shelve.open(cache_filepath) if cache_filepath is not None else None
+        version = "{0}:{1}".format(os.path.basename(stanford_postagger_jar_filepath),
+                                   os.path.basename(stanford_model_filepath))
+        self.cache = TagCache(cache_filepath, "stanford_pos", version, max_entries=cache_size) \
+            if cache_filepath is not None else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def tag(self, tokens):
         """Annotate a list of strings with their POS tags.
@@ -48,16 +58,13 @@ class PosTagger(object):
         if self.cache is None:
             return self.tag_uncached(tokens)
         else:
-            text = " ".join(tokens)
-            _hash = str(hash(text))
-            if _hash in self.cache:
-                return self.cache[_hash]
+            cached = self.cache.get_many([tokens])
+            if 0 in cached:
+                return cached[0]
             else:
                 tagged = self.tag_uncached(tokens)
-
-                self.cache[_hash] = tagged
-                if random.randint(1, 100) <= self.cache_synch_prob:
-                    self.synchronize_cache()
+                # written to disk in batches, see TagCache.flush
+                self.cache.put(tokens, tagged)
 
                 return tagged
 
@@ -91,6 +98,13 @@ class PosTagger(object):
         return ans
 
     def tag_sents(self, sents):
+        """Annotate sentences (lists of strings) with their POS tags, only the sentences that are not cached are sent
+        to the tagger."""
+        if self.cache is None:
+            return self.tag_sents_uncached(sents)
+        return self.cache.tag_sents(sents, self.tag_sents_uncached)
+
+    def tag_sents_uncached(self, sents):
         ret = []
         for i, x in enumerate(self.batch(sents, 2000)):
             idx, windows = self.chunkify(x, max=200)
@@ -128,5 +142,11 @@ class PosTagger(object):
         return pos
 
     def synchronize_cache(self):
-        """Synchronizes the shelve cache on the HDD with the version in the RAM."""
-        self.cache.sync()
+        """Synchronizes the cache on the HDD with the version in the RAM."""
+        if self.cache is not None:
+            self.cache.flush()
+
+    def close(self):
+        """Writes the cache to disk and closes its connection."""
+        if self.cache is not None:
+            self.cache.close()
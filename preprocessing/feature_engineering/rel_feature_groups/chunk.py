@@ -43,68 +43,68 @@ class ChunkFeatureGroup(object):
 
     def cphbnull(self, rel):
         chunks = rel.get_bet_chunks()
-        return "cphbnull={0}".format(bool(chunks))
+        return "cphbnull", str(bool(chunks))
 
     def cphbfl(self, rel):
         c_types = self.get_bet_chunk_types(rel)
 
         if len(c_types) == 1:
-            return "cphbfl={0}".format(c_types[0])
+            return "cphbfl", str(c_types[0])
         else:
-            return "cphbfl=#"
+            return "cphbfl", "#"
 
     def cphbf(self, rel):
         c_types = self.get_bet_chunk_types(rel)
 
         if len(c_types) > 1:
-            return "cphbf={0}".format(c_types[0])
+            return "cphbf", str(c_types[0])
         else:
-            return "cphbf=#"
+            return "cphbf", "#"
 
     def cphbl(self, rel):
         c_types = self.get_bet_chunk_types(rel)
 
         if len(c_types) > 1:
-            return "cphbl={0}".format(c_types[-1])
+            return "cphbl", str(c_types[-1])
         else:
-            return "cphbl=#"
+            return "cphbl", "#"
 
     def cphbo(self, rel):
         c_types = self.get_bet_chunk_types(rel)
 
         if len(c_types) > 2:
-            return "cphbo={0}".format("_".join(c_types[1:-1]))
+            return "cphbo", str("_".join(c_types[1:-1]))
         else:
-            return "cphbo=#"
+            return "cphbo", "#"
 
     def cphbm1f(self, rel):
         c_types = self.get_b_chunk_types(rel, 1)
 
         if len(c_types) >= 1:
-            return "cphbm1f={0}".format("_".join(c_types[-1]))
+            return "cphbm1f", str("_".join(c_types[-1]))
         else:
-            return "cphbm1f=#"
+            return "cphbm1f", "#"
 
     def cphbm1l(self, rel):
         c_types = self.get_b_chunk_types(rel, 2)
 
         if len(c_types) >= 2:
-            return "cphbm1l={0}".format("_".join(c_types[-2]))
+            return "cphbm1l", str("_".join(c_types[-2]))
         else:
-            return "cphbm1l=#"
+            return "cphbm1l", "#"
 
     def cpham2f(self, rel):
         c_types = self.get_a_chunk_types(rel, 1)
 
         if len(c_types) >= 1:
-            return "cpham2f={0}".format("_".join(c_types[-1]))
+            return "cpham2f", str("_".join(c_types[-1]))
         else:
-            return "cpham2f=#"
+            return "cpham2f", "#"
 
     def cpham2l(self, rel):
         c_types = self.get_a_chunk_types(rel, 2)
 
         if len(c_types) >= 2:
-            return "cpham2l={0}".format("_".join(c_types[-2]))
+            return "cpham2l", str("_".join(c_types[-2]))
         else:
-            return "cpham2l=#"
+            return "cpham2l", "#"
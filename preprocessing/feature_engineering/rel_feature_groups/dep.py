@@ -32,13 +32,13 @@ class DependencyFeatureGroup(object):
         et = rel.arg1_tag.tag_name
         dep = rel.arg1_deps()
 
-        return "et1dw1={0}{1}".format(et, dep)
+        return "et1dw1", "{0}{1}".format(et, dep)
 
     def et2dw2(self, rel):
         et = rel.arg2_tag.tag_name
         dep = rel.arg2_deps()
 
-        return "et2dw2={0}{1}".format(et, dep)
+        return "et2dw2", "{0}{1}".format(et, dep)
 
     def h1dw1(self, rel):
         arg1_tokens = rel.get_arg1_tokens()
@@ -46,7 +46,7 @@ class DependencyFeatureGroup(object):
         h1 = words[-1]
         dep = rel.arg1_deps()
 
-        return "h1dw1={0}{1}".format(h1, dep)
+        return "h1dw1", "{0}{1}".format(h1, dep)
 
     def h2dw2(self, rel):
         arg2_tokens = rel.get_arg2_tokens()
@@ -54,26 +54,26 @@ class DependencyFeatureGroup(object):
         h2 = words[-1]
         dep = rel.arg2_deps()
 
-        return "h1dw1={0}{1}".format(h2, dep)
+        return "h1dw1", "{0}{1}".format(h2, dep)
 
     @staticmethod
     def et12(rel):
-        return "et12={0}".format("_".join([rel.arg1_tag.tag_name, rel.arg2_tag.tag_name]))
+        return "et12", str("_".join([rel.arg1_tag.tag_name, rel.arg2_tag.tag_name]))
 
     def et12SameNP(self, rel):
         et12 = self.et12(rel)
 
-        return "et12SameNP={0}_{1}".format(et12, rel.sameNP())
+        return "et12SameNP", "{0}_{1}".format(et12, rel.sameNP())
 
     def et12SamePP(self, rel):
         et12 = self.et12(rel)
 
-        return "et12SamePP={0}_{1}".format(et12, rel.samePP())
+        return "et12SamePP", "{0}_{1}".format(et12, rel.samePP())
 
     def et12SameVP(self, rel):
         et12 = self.et12(rel)
 
-        return "et12SameVB={0}_{1}".format(et12, rel.sameVP())
+        return "et12SameVB", "{0}_{1}".format(et12, rel.sameVP())
 
 
 
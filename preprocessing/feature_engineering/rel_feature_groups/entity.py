@@ -21,4 +21,4 @@ class EntityFeatureGroup(object):
 
     @staticmethod
     def et12(link):
-        return "et12={0}".format("_".join([link.arg1_tag.tag_name, link.arg2_tag.tag_name]))
+        return "et12", str("_".join([link.arg1_tag.tag_name, link.arg2_tag.tag_name]))
@@ -26,9 +26,9 @@ class OverlapFeatureGroup(object):
             if token.label == cfg.NEG_LABEL:
                 count -=1
 
-        return "#mb={0}".format(count)
+        return "#mb", str(count)
 
     def wb(self, rel):
         tb = rel.get_tokens_bet()
         count = len(tb)
-        return "#wb={0}".format(count)
\ No newline at end of file
+        return "#wb", str(count)
\ No newline at end of file
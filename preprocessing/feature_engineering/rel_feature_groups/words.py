@@ -8,14 +8,14 @@ class WordFeatureGroup(object):
         pass
 
     def convert_window(self, window):
-        """Converts a RelationWindow object into a list of lists of features, where features are strings.
+        """Converts a RelationWindow object into a list of lists of features, where features are (name, value) pairs.
                 Args:
                     window: The EntityWindow object (defined in datasets.py) to use.
                 Returns:
                     List of lists of features.
                     One list of features for each token.
                     Each list can contain any number of features (including 0).
-                    Each feature is a string.
+                    Each feature is a (name, value) pair of strings.
                 """
         result = []
         assert isinstance(window, RelationWindow)
@@ -46,26 +46,26 @@ class WordFeatureGroup(object):
         # bag-of-words in M1
         arg1_tokens = link.get_arg1_tokens()
         words = self.get_words(arg1_tokens)
-        return "wm1={0}".format("_".join(words))
+        return "wm1", str("_".join(words))
 
     def hm1(self, link):
         # head word of M1
         arg1_tokens = link.get_arg1_tokens()
         words = self.get_words(arg1_tokens)
-        return "hm1={0}".format(words[-1])
+        return "hm1", str(words[-1])
 
     def wm2(self, link):
         # bag - of - words in M2
         arg2_tokens = link.get_arg2_tokens()
         words = self.get_words(arg2_tokens)
 
-        return "wm2={0}".format("_".join(words))
+        return "wm2", str("_".join(words))
 
     def hm2(self, link):
         # words.HM2(),  # head word of M2
         arg2_tokens = link.get_arg2_tokens()
         words = self.get_words(arg2_tokens)
-        return "hm2={0}".format(words[-1])
+        return "hm2", str(words[-1])
 
     def hm12(self, link):
         # words.HM12(),  # combination of HM1 and HM2
@@ -73,45 +73,45 @@ class WordFeatureGroup(object):
         arg2_tokens = link.get_arg2_tokens()
         words1 = self.get_words(arg1_tokens)
         words2 = self.get_words(arg2_tokens)
-        return "hm12={0}".format(words1[-1] + "_" + words2[-1])
+        return "hm12", str(words1[-1] + "_" + words2[-1])
 
     @staticmethod
     def wbnull(link):
         wb_tokens = link.get_tokens_bet()
-        return "wbnull={0}".format(bool(wb_tokens))
+        return "wbnull", str(bool(wb_tokens))
 
     def wbfl(self, link):
         wb_tokens = link.get_tokens_bet()
         words = self.get_words(wb_tokens)
         if len(words) == 1:
-            return "wbfl={0}".format("_".join(words))
+            return "wbfl", str("_".join(words))
         else:
-            return "wbfl=null"
+            return "wbfl", "null"
 
     def wbf(self, link):
         wb_tokens = link.get_tokens_bet()
         words = self.get_words(wb_tokens)
         if len(words) > 1:
-            return "wbf={0}".format(words[0])
+            return "wbf", str(words[0])
         else:
-            return "wbf=null"
+            return "wbf", "null"
 
     def wbl(self, link):
         wb_tokens = link.get_tokens_bet()
         words = self.get_words(wb_tokens)
         if len(words) > 1:
-            return "wbl={0}".format(words[-1])
+            return "wbl", str(words[-1])
         else:
-            return "wbl=null"
+            return "wbl", "null"
 
     def wbo(self, link):
         wb_tokens = link.get_tokens_bet()
         words = self.get_words(wb_tokens)
 
         if len(words) > 1:
-            return "wbo={0}".format("_".join(words[1:-1]))
+            return "wbo", str("_".join(words[1:-1]))
         else:
-            return "wbo=null"
+            return "wbo", "null"
 
     def bm1f(self, link):
         # "word1 word2 arg1"
@@ -122,7 +122,7 @@ class WordFeatureGroup(object):
             b_words = words[-1]
         except IndexError:
             b_words = "null"
-        return "bm1f={0}".format(b_words)
+        return "bm1f", str(b_words)
 
     def bm1l(self, link):
         # "word1 word2 arg1"
@@ -134,7 +134,7 @@ class WordFeatureGroup(object):
         except IndexError:
             b_words = "null"
 
-        return "bm1l={0}".format(b_words)
+        return "bm1l", str(b_words)
 
     def am2f(self, link):
         # "arg2 word1 word2"
@@ -145,7 +145,7 @@ class WordFeatureGroup(object):
             a_words = words[0]
         except IndexError:
             a_words = "null"
-        return "am2f={0}".format(a_words)
+        return "am2f", str(a_words)
 
     def am2l(self, link):
         a_tokens = link.get_a_tokens(2)
@@ -154,4 +154,4 @@ class WordFeatureGroup(object):
             a_words = words[1]
         except IndexError:
             a_words = "null"
-        return "am2l={0}".format(a_words)
+        return "am2l", str(a_words)
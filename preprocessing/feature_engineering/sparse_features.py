@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Streaming one hot encoding of entity feature tables into a scipy.sparse matrix."""
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# value that stands for a missing feature in the codes of a column (the value pandas' fillna(0) used to give it)
+MISSING = 0
+
+
+def family(column):
+    """Returns the feature family of a column, e.g. "pos" for "-1:pos"."""
+    return column.split(':', 1)[-1]
+
+
+class SparseFeaturizer(object):
+    """One hot encodes feature tables (see datasets.expand_skipchain) into a CSR matrix, a batch of rows at a time.
+
+    Every (column, value) pair that is seen gets a matrix column, in the order they are seen, and the vocabulary is
+    kept: later batches (e.g. the protocols added by WLPDataset.update) get the same matrix columns for the same
+    features and new features get new columns at the end. Missing values (None) have no matrix column. `groups`
+    holds the matrix columns of each table column, so feature families can be sliced out of the matrix (columns()).
+
+    Each value also gets a code in its table column (`codes`), which gives the integer version of a table (what
+    WLPDataset keeps in f_df).
+    """
+
+    def __init__(self):
+        self.vocab = dict()
+        self.groups = OrderedDict()
+        self.codes = OrderedDict()
+        self.__reset()
+
+    def __reset(self):
+        # rows added since the last matrix()
+        self._indices = []
+        self._indptr = [np.zeros(1, dtype=np.int64)]
+        self._nnz = 0
+        self._rows = 0
+
+    def __getstate__(self):
+        # the rows that were not turned into a matrix yet are not part of the featurizer
+        state = self.__dict__.copy()
+        state.update(_indices=[], _indptr=[np.zeros(1, dtype=np.int64)], _nnz=0, _rows=0)
+        return state
+
+    @property
+    def size(self):
+        """Number of matrix columns."""
+        return len(self.vocab)
+
+    def code(self, column, value):
+        col_codes = self.codes.setdefault(column, dict())
+        if value not in col_codes:
+            col_codes[value] = len(col_codes)
+        return col_codes[value]
+
+    def matrix_column(self, column, value):
+        key = (column, value)
+        if key not in self.vocab:
+            self.vocab[key] = len(self.vocab)
+            self.groups.setdefault(column, []).append(self.vocab[key])
+        return self.vocab[key]
+
+    def add(self, f_columns, n_rows):
+        """One hot encodes the `n_rows` rows of the table `f_columns` and adds them to the matrix being built.
+
+        Returns:
+            The codes of the table, an OrderedDict of column -> int array.
+        """
+        codes = OrderedDict()
+        matrix_columns = []
+        for column, values in f_columns.items():
+            # -1 for missing values, which picks the last element of value_codes and value_columns
+            local, uniques = pd.factorize(np.asarray(values, dtype=object))
+            value_codes = [self.code(column, value) for value in uniques]
+            value_columns = [self.matrix_column(column, value) for value in uniques]
+            if (local == -1).any():
+                value_codes.append(self.code(column, MISSING))
+                value_columns.append(-1)
+
+            codes[column] = np.array(value_codes, dtype=np.int64)[local]
+            matrix_columns.append(np.array(value_columns, dtype=np.int64)[local])
+
+        if matrix_columns:
+            matrix_columns = np.stack(matrix_columns, axis=1)
+            present = matrix_columns >= 0
+            self._indices.append(matrix_columns[present])
+            row_nnz = present.sum(axis=1)
+        else:
+            row_nnz = np.zeros(n_rows, dtype=np.int64)
+
+        self._indptr.append(self._nnz + np.cumsum(row_nnz))
+        self._nnz += int(row_nnz.sum())
+        self._rows += n_rows
+        return codes
+
+    def matrix(self):
+        """Returns the rows added since the last call as a CSR matrix, with a column for every feature known so far."""
+        indices = np.concatenate(self._indices) if self._indices else np.zeros(0, dtype=np.int64)
+        matrix = sparse.csr_matrix((np.ones(len(indices)), indices, np.concatenate(self._indptr)),
+                                   shape=(self._rows, self.size))
+        matrix.sort_indices()
+        self.__reset()
+        return matrix
+
+    def widen(self, matrix):
+        """Returns `matrix` (made before features were added) with a column for every feature known now."""
+        return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], self.size))
+
+    def frame(self, code_tables, lengths):
+        """Stacks the codes returned by add() (of `lengths` rows each) into a DataFrame with a column for every table
+        column known so far, rows of tables without a column get its MISSING code."""
+        data = OrderedDict()
+        for column in list(self.codes):
+            parts = [table[column] if column in table else np.full(n, self.code(column, MISSING), dtype=np.int64)
+                     for table, n in zip(code_tables, lengths)]
+            data[column] = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+        return pd.DataFrame(data)
+
+    def columns(self, families):
+        """Returns the matrix columns of the feature families `families` (e.g. ["pos", "lm"]), at every offset."""
+        return sorted(c for column, group in self.groups.items() if family(column) in families for c in group)
+
+    def feature_names(self):
+        """Returns the name of each matrix column, e.g. "0:pos=NN"."""
+        names = [None] * self.size
+        for (column, value), i in self.vocab.items():
+            names[i] = "{0}={1}".format(column, value)
+        return names
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Pos taggers that can be used by ProtoFile to generate the pos tags of a protocol.
+
+A tagger is anything with a `name` and a `version` (used in the cache keys of its tags) and a
+`tag_sents(sents)` method that takes a list of sentences (each a string of space separated words) and returns
+[(word, pos, chunk), ...] for each sentence, with chunks in IOB format (e.g. B-NP, I-NP, O).
+"""
+import os
+
+import nltk
+from nltk.chunk import tree2conlltags
+from nltk.tag.perceptron import PerceptronTagger
+
+import config as cfg
+import features_config as feat_cfg
+from preprocessing.feature_engineering.GeniaTagger import GeniaTaggerPool
+from preprocessing.standin_tools import StandinStanfordTagger, StandinTagger
+
+# chunks of the genia tagger that can be built from penn treebank tags
+CHUNK_GRAMMAR = r"""
+    NP: {<PDT>?<DT|PRP\$|POS>?<CD|JJ.*|VBN|VBG>*<NN.*|CD|PRP|FW|SYM>+}
+    VP: {<MD>?<RB.*>?<VB.*>+<RP>?}
+    PP: {<IN|TO>}
+    ADJP: {<RB.*>?<JJ.*>+}
+    ADVP: {<RB.*>+}
+"""
+
+
+class NltkTagger(object):
+    """In process tagger, nltk's averaged perceptron pos tagger followed by a regular expression chunker.
+
+    Needs no external process, so experiments and inference can tag protocols without starting the genia tagger or
+    a stanford JVM. Its tags are close to, but not the same as, the ones of the genia tagger.
+    """
+    name = "nltk"
+
+    def __init__(self):
+        try:
+            self.tagger = PerceptronTagger()
+        except LookupError:
+            print("Downloading nltk's averaged perceptron tagger ...")
+            nltk.download('averaged_perceptron_tagger_eng', quiet=True)
+            nltk.download('averaged_perceptron_tagger', quiet=True)
+            self.tagger = PerceptronTagger()
+
+        self.chunker = nltk.RegexpParser(CHUNK_GRAMMAR)
+        self.version = "{0}:{1}".format(nltk.__version__, " ".join(CHUNK_GRAMMAR.split()))
+
+    def tag_sents(self, sents):
+        ret_sents = []
+        for sent in sents:
+            words = sent.split()
+            if not words:
+                ret_sents.append([])
+                continue
+
+            pos_tags = self.tagger.tag(words)
+            ret_sents.append(tree2conlltags(self.chunker.parse(pos_tags)))
+
+        return ret_sents
+
+
+def genia_tagger_workers(read_workers=None):
+    """Returns the number of geniatagger processes of each of `read_workers` (defaults to cfg.READ_WORKERS) read
+    workers, see feat_cfg.GENIA_TAGGER_WORKERS."""
+    if feat_cfg.GENIA_TAGGER_WORKERS is not None:
+        return feat_cfg.GENIA_TAGGER_WORKERS
+    if read_workers is None:
+        read_workers = cfg.READ_WORKERS
+    return max(1, (os.cpu_count() or 1) // 2 // max(1, read_workers))
+
+
+def create_pos_tagger(backend=None, read_workers=None):
+    """Returns the tagger for `backend` (defaults to feat_cfg.POS_TAGGER_BACKEND), to be used by `read_workers` read
+    workers at once.
+
+    "genia": pool of geniatagger processes, "nltk": NltkTagger, "stanford": None, in which case ProtoFile tags with the
+    stanford pos tagger (which gives (word, pos) pairs without chunks). With feat_cfg.USE_STANDIN_TOOLS, the sessions
+    of the genia pool are StandinTaggers and stanford is replaced by a StandinStanfordTagger.
+    """
+    if backend is None:
+        backend = feat_cfg.POS_TAGGER_BACKEND
+
+    if backend == "genia" and feat_cfg.USE_STANDIN_TOOLS:
+        return GeniaTaggerPool(feat_cfg.GENIA_TAGGER_FILEPATH, genia_tagger_workers(read_workers),
+                               session=StandinTagger)
+    elif backend == "stanford" and feat_cfg.USE_STANDIN_TOOLS:
+        return StandinStanfordTagger()
+
+    if backend == "genia":
+        return GeniaTaggerPool(feat_cfg.GENIA_TAGGER_FILEPATH, genia_tagger_workers(read_workers))
+    elif backend == "nltk":
+        return NltkTagger()
+    elif backend == "stanford":
+        return None
+
+    raise ValueError("Unknown pos tagger backend {0}, use one of genia, nltk, stanford".format(backend))
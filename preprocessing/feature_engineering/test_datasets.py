@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+import numpy as np
+
+from preprocessing.feature_engineering.datasets import EntityWindow, concat_columns, expand_skipchain
+
+
+class Token(object):
+    def __init__(self, word):
+        self.word = word
+        self.label = 'O'
+        self.feature_values = None
+
+
+class LengthFeature(object):
+    def convert_window(self, window):
+        return [[("l", str(len(token.word)))] for token in window.tokens]
+
+
+class CapsFeature(object):
+    # only some of the tokens have this feature
+    def convert_window(self, window):
+        return [[("cap", "1")] if token.word.istitle() else [] for token in window.tokens]
+
+
+class TestSkipchain(TestCase):
+    def setUp(self):
+        self.windows = []
+        for words in [["Add", "5", "ml"], ["Spin"], ["mix", "the", "Cells", "gently"]]:
+            window = EntityWindow([Token(word) for word in words], "p1", None)
+            window.apply_features([LengthFeature(), CapsFeature()])
+            self.windows.append(window)
+
+    def assert_same_as_dicts(self, left, right):
+        lengths = [len(window.tokens) for window in self.windows]
+        columns = expand_skipchain(concat_columns([window.feature_columns() for window in self.windows], lengths),
+                                   np.repeat(np.arange(len(lengths)), lengths), left, right)
+
+        dicts = [window.get_feature_values_list(i, left, right)
+                 for window in self.windows for i in range(len(window.tokens))]
+        self.assertEqual(set(columns), set(k for d in dicts for k in d))
+        for row, d in enumerate(dicts):
+            self.assertEqual({c: v[row] for c, v in columns.items() if v[row] is not None}, dict(d))
+
+    def test_no_context(self):
+        self.assert_same_as_dicts(0, 0)
+
+    def test_context_stops_at_sentences(self):
+        self.assert_same_as_dicts(2, 1)
+        columns = self.windows[0].get_feature_columns(1, 1)
+        self.assertEqual(list(columns["-1:l"]), [None, "3", "1"])
+        self.assertEqual(list(columns["-1:cap"]), [None, "1", None])
+        # no token has a capitalized right neighbour
+        self.assertNotIn("1:cap", columns)
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from unittest import TestCase
+
+import numpy as np
+
+from preprocessing.feature_engineering.sparse_features import MISSING, SparseFeaturizer
+
+
+class TestSparseFeaturizer(TestCase):
+    def setUp(self):
+        self.featurizer = SparseFeaturizer()
+        self.codes = self.featurizer.add(OrderedDict([("0:pos", ["NN", "VB", "NN"]), ("1:pos", ["VB", "NN", None])]), 3)
+
+    def test_matrix(self):
+        matrix = self.featurizer.matrix()
+        self.assertEqual(matrix.shape, (3, 4))
+        self.assertEqual(matrix.toarray().tolist(), [[1, 0, 1, 0], [0, 1, 0, 1], [1, 0, 0, 0]])
+        self.assertEqual(self.featurizer.feature_names(), ["0:pos=NN", "0:pos=VB", "1:pos=VB", "1:pos=NN"])
+        self.assertEqual(self.featurizer.columns(["pos"]), [0, 1, 2, 3])
+
+    def test_codes(self):
+        self.assertEqual(self.codes["0:pos"].tolist(), [0, 1, 0])
+        self.assertEqual(self.codes["1:pos"].tolist(), [0, 1, 2])
+        self.assertEqual(self.featurizer.codes["1:pos"][MISSING], 2)
+
+    def test_vocabulary_is_kept(self):
+        old = self.featurizer.matrix()
+        codes = self.featurizer.add(OrderedDict([("0:pos", ["JJ", "NN"]), ("0:lm", ["add", None])]), 2)
+        new = self.featurizer.matrix()
+        self.assertEqual(codes["0:pos"].tolist(), [2, 0])
+        self.assertEqual(new.toarray().tolist(), [[0, 0, 0, 0, 1, 1], [1, 0, 0, 0, 0, 0]])
+        self.assertEqual(self.featurizer.widen(old).shape, (3, 6))
+
+        f_df = self.featurizer.frame([self.codes, codes], [3, 2])
+        self.assertEqual(list(f_df.columns), ["0:pos", "1:pos", "0:lm"])
+        self.assertEqual(f_df["1:pos"].tolist(), [0, 1, 2, 2, 2])
+        self.assertEqual(f_df["0:lm"].tolist(), [1, 1, 1, 0, 1])
+        self.assertTrue(np.array_equal(self.featurizer.columns(["lm"]), [5]))
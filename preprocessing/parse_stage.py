@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Corpus level parsing stages, that parse the uncached sentences of all protocols in a few large batches."""
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from nltk.parse.stanford import StanfordParser
+
+import config as cfg
+import features_config as feat_cfg
+from preprocessing import standin_tools
+from preprocessing.utils import get_stanford_dep_parser
+
+
+class DepParseStage(object):
+    """Dependency parses the sentences of all protocols whose dependency graphs are not cached yet.
+
+    Every call of the stanford dependency parser starts a new JVM and loads the parser models, which takes longer than
+    parsing the sentences of a protocol. So instead of parsing each protocol on its own, the sentences of all
+    protocols are collected and parsed in batches of `batch_size` sentences (one JVM per batch), on up to `workers`
+    JVMs at a time. The graphs are then handed back to their protocols, which store them in their own caches.
+    """
+
+    def __init__(self, workers=None, batch_size=None):
+        """
+        Args:
+            workers: number of parser JVMs that run at the same time, defaults to cfg.PARSE_WORKERS.
+            batch_size: max number of sentences parsed by one JVM, defaults to cfg.PARSE_BATCH_SIZE.
+        """
+        self.workers = workers if workers is not None else cfg.PARSE_WORKERS
+        self.batch_size = batch_size if batch_size is not None else cfg.PARSE_BATCH_SIZE
+        self.parse_batch = standin_tools.dep_parse_batch if feat_cfg.USE_STANDIN_TOOLS else self.stanford_parse_batch
+
+    @staticmethod
+    @get_stanford_dep_parser(path_to_jar=feat_cfg.STANFORD_PARSER_JAR,
+                             path_to_models_jar=feat_cfg.STANFORD_PARSER_MODEL_JAR)
+    def stanford_parse_batch(pos_tags, dep_parser):
+        # adding pos data to dep parser speeds up dep generation even further
+        dep_graphs = dep_parser.tagged_parse_sents(pos_tags)
+
+        # save dependency graph in conll format
+        return [next(deps).to_conll(10) for deps in dep_graphs]
+
+    def parse(self, pos_tags):
+        """Returns the conll dependencies of each sentence of `pos_tags`, in order."""
+        batches = [pos_tags[i:i + self.batch_size] for i in range(0, len(pos_tags), self.batch_size)]
+
+        conll_deps = []
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            # the parsing happens in the JVMs, the threads only wait for them. map keeps the order of the batches.
+            for batch_deps in executor.map(self.parse_batch, batches):
+                conll_deps.extend(batch_deps)
+
+        return conll_deps
+
+    def run(self, articles):
+        """Parses the sentences of all `articles` that have no dependencies yet, and sets their conll_deps."""
+        pending = [article for article in articles if article.conll_deps is None]
+        if not pending:
+            return
+
+        pos_tags = [pos_tag1d for article in pending for pos_tag1d in article.pos_tags]
+        print("dependency parsing {0} sentences of {1} protocols".format(len(pos_tags), len(pending)))
+        conll_deps = self.parse(pos_tags)
+
+        start = 0
+        for article in pending:
+            end = start + len(article.pos_tags)
+            article.set_deps(conll_deps[start:end])
+            start = end
+
+
+class ParseTreeStage(object):
+    """Constituency parses the sentences of all protocols whose parse trees are not cached yet.
+
+    Works like DepParseStage, but as protocol steps repeat a lot across protocols, each distinct sentence is only
+    parsed once. Batches are parsed on up to `workers` parser JVMs, and a protocol gets its trees (and caches them)
+    as soon as the last batch holding one of its sentences is done, so an interrupted run keeps what it parsed.
+    """
+
+    def __init__(self, workers=None, batch_size=None):
+        """
+        Args:
+            workers: number of parser JVMs that run at the same time, defaults to cfg.PARSE_WORKERS.
+            batch_size: max number of sentences parsed by one JVM, defaults to cfg.PARSE_BATCH_SIZE.
+        """
+        self.workers = workers if workers is not None else cfg.PARSE_WORKERS
+        self.batch_size = batch_size if batch_size is not None else cfg.PARSE_BATCH_SIZE
+        self.parse_batch = standin_tools.parse_tree_batch if feat_cfg.USE_STANDIN_TOOLS else self.stanford_parse_batch
+
+    @staticmethod
+    def stanford_parse_batch(sents):
+        parser = StanfordParser(path_to_jar=feat_cfg.STANFORD_PARSER_JAR,
+                                path_to_models_jar=feat_cfg.STANFORD_PARSER_MODEL_JAR,
+                                java_options="-mx3000m")
+        return [next(trees) for trees in parser.raw_parse_sents(sents)]
+
+    def run(self, articles):
+        """Parses the sentences of all `articles` that have no parse trees yet, and sets their parse_trees."""
+        pending = [article for article in articles if article.parse_trees is None]
+        if not pending:
+            return
+
+        # distinct sentence -> indexes of the pending protocols that contain it
+        sent_articles = OrderedDict()
+        for i, article in enumerate(pending):
+            for sent in article.parse_sents():
+                sent_articles.setdefault(sent, set()).add(i)
+
+        # number of distinct sentences each protocol still waits for
+        remaining = defaultdict(int)
+        for article_idxs in sent_articles.values():
+            for i in article_idxs:
+                remaining[i] += 1
+
+        sents = list(sent_articles)
+        print("parsing {0} distinct sentences of {1} protocols".format(len(sents), len(pending)))
+        trees = dict()
+
+        # protocols without sentences are done right away
+        for i, article in enumerate(pending):
+            if remaining[i] == 0:
+                article.set_parse_trees([])
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {executor.submit(self.parse_batch, sents[i:i + self.batch_size]): sents[i:i + self.batch_size]
+                       for i in range(0, len(sents), self.batch_size)}
+            for future in as_completed(futures):
+                batch = futures[future]
+                for sent, tree in zip(batch, future.result()):
+                    trees[sent] = tree
+                    for i in sent_articles[sent]:
+                        remaining[i] -= 1
+                        if remaining[i] == 0:
+                            pending[i].set_parse_trees([trees[s] for s in pending[i].parse_sents()])
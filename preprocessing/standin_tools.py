@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Local stand-ins for the geniatagger, the stanford pos tagger and the stanford parsers.
+
+They have the same interfaces as the real tools (as used by ProtoFile and the parse stages), need no binaries, jars
+or network, and take a fixed, configurable time: a startup latency per process / JVM they stand in for, and a
+latency per sentence. Their output is deterministic, but not linguistically meaningful. They are meant for
+benchmarking and profiling the preprocessing pipeline (e.g. a full WLPDataset build) on an offline machine, set
+feat_cfg.USE_STANDIN_TOOLS to use them.
+"""
+import time
+
+from nltk import Tree
+
+import features_config as feat_cfg
+
+
+def wait(startup, sentences):
+    """Sleeps for `startup` seconds plus the per sentence latency of `sentences` sentences."""
+    time.sleep(startup + sentences * feat_cfg.STANDIN_SENTENCE_LATENCY)
+
+
+def guess_pos(word):
+    # just enough variety for the pos features to have more than one value
+    if word[0].isdigit():
+        return "CD"
+    if not word[0].isalnum():
+        return word if len(word) == 1 else "SYM"
+    if word.endswith("ing") or word.endswith("ed"):
+        return "VBN"
+    if word.endswith("ly"):
+        return "RB"
+    return "NN"
+
+
+class StandinTagger(object):
+    """Stands in for a GeniaTagger session, returns (word, pos, chunk) for each word.
+
+    Like a session it is started on first use, so create_pos_tagger runs several of them in a GeniaTaggerPool, the
+    way it runs the real sessions.
+    """
+    name = "standin"
+    version = "1"
+
+    def __init__(self, path_to_tagger=None):
+        self.started = False
+
+    def __getstate__(self):
+        # like a real tagger, every process starts its own
+        state = self.__dict__.copy()
+        state['started'] = False
+        return state
+
+    def start(self):
+        if not self.started:
+            wait(feat_cfg.STANDIN_STARTUP_LATENCY, 0)
+            self.started = True
+
+    def is_alive(self):
+        return self.started
+
+    def close(self):
+        self.started = False
+
+    def tag_sents(self, sents):
+        self.start()
+        wait(0, len(sents))
+        ret_sents = []
+        for sent in sents:
+            ret_sents.append([(word, guess_pos(word), "B-NP" if i == 0 else "I-NP")
+                              for i, word in enumerate(sent.split())])
+
+        return ret_sents
+
+
+class StandinStanfordTagger(object):
+    """Stands in for the stanford pos tagger (PosTagger), returns (word, pos) for each word, without chunks. Like the
+    stanford tagger, every call starts a JVM."""
+    name = "standin_stanford"
+    version = "1"
+
+    def tag_sents(self, sents):
+        wait(feat_cfg.STANDIN_STARTUP_LATENCY, len(sents))
+        return [[(word, guess_pos(word)) for word in sent.split()] for sent in sents]
+
+
+def dep_parse_batch(pos_tags):
+    """Stands in for DepParseStage.stanford_parse_batch, every word depends on the word before it."""
+    wait(feat_cfg.STANDIN_STARTUP_LATENCY, len(pos_tags))
+
+    conll_deps = []
+    for pos_tag1d in pos_tags:
+        lines = []
+        for i, pos_tag in enumerate(pos_tag1d):
+            word, tag = pos_tag[0], pos_tag[1]
+            lines.append("\t".join([str(i + 1), word, word, tag, tag, "_", str(i), "root" if i == 0 else "dep",
+                                    "_", "_"]))
+        conll_deps.append("\n".join(lines) + "\n")
+
+    return conll_deps
+
+
+def parse_tree_batch(sents):
+    """Stands in for ParseTreeStage.stanford_parse_batch, a flat tree of the words of each sentence."""
+    wait(feat_cfg.STANDIN_STARTUP_LATENCY, len(sents))
+
+    return [Tree("ROOT", [Tree("S", [Tree(guess_pos(word), [word]) for word in sent.split()])]) for sent in sents]
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Persistent sentence level cache of tagger output, shared by the stanford and genia pos taggers."""
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+class TagCache(object):
+    """Sqlite backed cache from a sentence to its tags.
+
+    Keys are sha1 hashes of the tool, its version and the sentence, so they are the same in every run (unlike
+    hash(), which is randomized per process). Several processes can read and write the same file: sqlite locks it,
+    and writers wait for each other instead of failing. New entries are kept in memory and written in one transaction
+    every `flush_every` entries (and on flush()/close()). When the cache holds more than `max_entries` sentences, the
+    least recently used ones are evicted.
+    """
+
+    def __init__(self, cache_filepath, tool, version, max_entries=1000000, flush_every=1000):
+        """
+        Args:
+            cache_filepath: sqlite file of the cache, created if it does not exist.
+            tool: name of the tagger, e.g. "genia". Taggers sharing the file get separate keys.
+            version: version string of the tagger, changing it gives new keys.
+            max_entries: max number of sentences (of all tools) kept in the file.
+            flush_every: number of new entries kept in memory before they are written.
+        """
+        self.cache_filepath = cache_filepath
+        self.tool = tool
+        self.version = version
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.pending = dict()
+        self.used = set()
+        self._conn = None
+
+    def __getstate__(self):
+        # connections cannot be pickled, each process opens its own
+        self.flush()
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            dirname = os.path.dirname(self.cache_filepath)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._conn = sqlite3.connect(self.cache_filepath, timeout=60)
+            # readers do not block the writer and the other way round
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tags (key TEXT PRIMARY KEY, value BLOB, used REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS tags_used ON tags (used)")
+            self._conn.commit()
+        return self._conn
+
+    def key(self, sent):
+        """Returns a stable hash of `sent` (a string, or a list of words)."""
+        h = hashlib.sha1()
+        h.update("{0}\0{1}\0".format(self.tool, self.version).encode('utf-8'))
+        h.update(repr(sent).encode('utf-8'))
+        return h.hexdigest()
+
+    def get_many(self, sents):
+        """Returns a dict from the index of each cached sentence in `sents` to its tags."""
+        keys = [self.key(sent) for sent in sents]
+        found = dict()
+        missing = set()
+        for key in keys:
+            if key in self.pending:
+                found[key] = self.pending[key]
+            else:
+                missing.add(key)
+
+        missing = list(missing)
+        # sqlite limits the number of parameters of a query
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            query = "SELECT key, value FROM tags WHERE key IN ({0})".format(",".join("?" * len(chunk)))
+            for key, value in self.conn.execute(query, chunk):
+                found[key] = pickle.loads(value)
+                self.used.add(key)
+
+        return {i: found[key] for i, key in enumerate(keys) if key in found}
+
+    def put(self, sent, tags):
+        self.pending[self.key(sent)] = tags
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Writes the new entries, marks the read ones as recently used, and evicts the least recently used ones."""
+        if not self.pending and not self.used:
+            return
+
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tags (key, value, used) VALUES (?, ?, ?)",
+                                  [(key, pickle.dumps(tags), now) for key, tags in self.pending.items()])
+            self.conn.executemany("UPDATE tags SET used = ? WHERE key = ?", [(now, key) for key in self.used])
+
+            if self.pending:
+                count = self.conn.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+                if count > self.max_entries:
+                    self.conn.execute("DELETE FROM tags WHERE key IN (SELECT key FROM tags ORDER BY used LIMIT ?)",
+                                      (count - self.max_entries,))
+
+        self.pending = dict()
+        self.used = set()
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def tag_sents(self, sents, tag_fn):
+        """Returns the tags of `sents`, calling tag_fn(list of sentences) only for the ones that are not cached.
+
+        Sentences that occur more than once are only tagged once.
+        """
+        tags = self.get_many(sents)
+
+        # uncached sentence (as a tuple if it is a list of words) -> index of its first occurrence
+        first = OrderedDict()
+        for i, sent in enumerate(sents):
+            if i not in tags:
+                first.setdefault(tuple(sent) if isinstance(sent, list) else sent, i)
+
+        if first:
+            uncached = [sents[i] for i in first.values()]
+            new_tags = dict()
+            for sent, i, sent_tags in zip(uncached, first.values(), tag_fn(uncached)):
+                self.put(sent, sent_tags)
+                new_tags[i] = sent_tags
+            for i, sent in enumerate(sents):
+                if i not in tags:
+                    tags[i] = new_tags[first[tuple(sent) if isinstance(sent, list) else sent]]
+
+        self.flush()
+        return [tags[i] for i in range(len(sents))]
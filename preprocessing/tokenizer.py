@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Process wide Moses tokenizer with a cache of tokenized lines."""
+from functools import lru_cache
+
+from sacremoses import MosesTokenizer
+
+import config as cfg
+
+_tokenizer = None
+
+
+def get_tokenizer():
+    """Returns the MosesTokenizer of this process, it is built once (loading its patterns is not free)."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = MosesTokenizer()
+    return _tokenizer
+
+
+@lru_cache(maxsize=cfg.TOKENIZER_CACHE_SIZE)
+def _tokenize(line):
+    # tuples, so that callers cannot change the cached tokens
+    return tuple(get_tokenizer().tokenize(line))
+
+
+@lru_cache(maxsize=cfg.TOKENIZER_CACHE_SIZE)
+def _tokenize_lower(line):
+    # derived from the cached tokenization of the line instead of running moses again
+    return tuple(word.lower() for word in _tokenize(line))
+
+
+def tokenize(line, lowercase=False):
+    """Returns the words of `line` (a list of strings), lowercased if `lowercase`.
+
+    Lines are cached (least recently used ones are dropped first), protocol steps and tag texts repeat a lot.
+    """
+    return list(_tokenize_lower(line) if lowercase else _tokenize(line))
+
+
+def tokenize_lines(lines, lowercase=False):
+    """Batch version of tokenize, returns a list of words for each line."""
+    return [tokenize(line, lowercase) for line in lines]
+
+
+def cache_info():
+    return _tokenize.cache_info()
@@ -9,6 +9,7 @@ from torch.utils.data import DataLoader
 from tqdm import tqdm
 import numpy as np
 from corpus.BratWriter import Writer, BratFile
+from corpus.CorpusStore import CorpusStore
 from corpus.InferenceDataset import InferenceDataset
 from corpus.WLPDataset import WLPDataset
 
@@ -78,7 +79,11 @@ def test(name, data, tag_idx, model, lm_vocab_size, char_level):
 def inference(p_txt, cfg):
     model_save_path = cfg['MODEL_SAVE_PATH']
     print("Loading Dataset ...")
-    corpus = pickle.load(open(cfg["CORPUS_FILE"], "rb"))
+    if os.path.isdir(cfg["CORPUS_FILE"]):
+        # only the vocabulary part of the corpus store is read
+        corpus = CorpusStore(cfg["CORPUS_FILE"])
+    else:
+        corpus = pickle.load(open(cfg["CORPUS_FILE"], "rb"))
     dataset = InferenceDataset(p_txt=p_txt,
                                word_index=corpus.word_index,
                                char_index=corpus.char_index,